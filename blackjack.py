@@ -2,22 +2,74 @@
 Welcome to the exciting world of text-based BlackJack!
 Step right up and test your luck!!
 To play, run this file in your console using 'python blackjack.py'
+
+To play without the console, e.g. to simulate a strategy, give Engine a
+function that decides each move:
+from blackjack import Engine
+engine = Engine()
+results = list(engine.play_rounds(lambda hand, upcard: 'h' if hand.value < 17 else 's', 1000))
+
+For house-edge estimates over millions of hands, simulate_batch plays a
+fixed strategy table on whole batches of hands at once (needs numpy):
+from blackjack import simulate_batch
+print(simulate_batch(1000000, seed=1).summary())
+simulate_parallel does the same across every core, giving the same numbers
+for a seed whatever the number of processes
+
+StrategySolver works out the best hit/stand play exactly:
+from blackjack import StrategySolver, TableStrategy
+table = StrategySolver(decks=6).strategy_table()
+engine.play_rounds(TableStrategy(table), 1000) or simulate_batch(1000000, table)
+
+CardCounter keeps Hi-Lo, KO and Omega II counts of the cards an Engine
+shows and works out the exact EV of hitting or standing for the cards
+still unseen:
+counter = CardCounter(decks=6)
+engine = Engine(Shoe(6), counter=counter)
+engine.play_rounds(counter.strategy, 1000)
+
+simulate_bankroll plays whole sessions with a betting system (FlatBet,
+CountSpread or KellyBet) and reports risk of ruin, drawdowns and
+percentile bankroll curves:
+simulate_bankroll(10000, 500, CountSpread(), TableStrategy(table), bankroll=200, seed=1)
 """
+import math
 import random
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+#cards as small integers: code i is the card RANKS[i]
+RANKS = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+#hard value of each card code, aces count 1
+HARD_VALUES = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10]
+OUTCOMES = ['player', 'dealer', 'push']
+#card code of each label
+RANK_CODES = dict((rank, code) for code, rank in enumerate(RANKS))
+
+#count tags of each card code, in RANKS order: A, 2-10, J, Q, K
+COUNTING_SYSTEMS = {
+    'hi-lo': (-1, 1, 1, 1, 1, 1, 0, 0, 0, -1, -1, -1, -1),
+    'ko': (-1, 1, 1, 1, 1, 1, 1, 0, 0, -1, -1, -1, -1),
+    'omega-ii': (0, 1, 1, 2, 2, 2, 1, 0, -1, -2, -2, -2, -2),
+}
 
 class Deck(object):
     #point values dict (note ace can be 1 or 11, see card_values function)
     card_values = { 'A': 11, '2':2, '3':3, '4':4, '5':5, '6':6, '7':7, '8':8, '9':9,'10':10, 'J':10, 'Q':10, 'K':10 }
 
-    def __init__(self):
+    def __init__(self, rng=None):
         self.unused_cards = []
+        self.shuffles = 0
+        self.rng = rng if rng is not None else random
 
     def shuffle(self):
         """
         Resets the deck
         """
         self.unused_cards = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K'] * 4
-        random.shuffle(self.unused_cards)
+        self.rng.shuffle(self.unused_cards)
+        self.shuffles += 1
 
     def draw_card(self):
         """
@@ -27,21 +79,99 @@ class Deck(object):
         """
 
         if (len(self.unused_cards) == 0):
-            print('Dealer had to shuffle the deck')
             self.shuffle()
-        num_unused = len(self.unused_cards)
         card = self.unused_cards.pop(0)
         return card
 
+    def needs_shuffle(self):
+        """
+        Returns true if the deck should be shuffled before the next round
+        """
+        return len(self.unused_cards) == 0
+
     def print_unused_cards(self):
         print(self.unused_cards)
 
 
+class Shoe(object):
+    """
+    Casino shoe of 1 to 8 decks with a cut card
+    Cards are codes into RANKS kept in a byte array, drawn from the end in
+    O(1). counts holds how many of each code are left, kept up to date on
+    every draw. Once the cut card is reached (penetration of the shoe has
+    been dealt), needs_shuffle() asks for a shuffle before the next round
+    """
+    def __init__(self, decks=6, penetration=0.75, rng=None):
+        if not 1 <= decks <= 8:
+            raise ValueError('decks must be between 1 and 8, not %s' %(decks))
+        if not 0 < penetration <= 1:
+            raise ValueError('penetration must be above 0 and at most 1, not %s' %(penetration))
+
+        self.decks = decks
+        self.penetration = penetration
+        self.rng = rng if rng is not None else random
+        self.cards = array('B', list(range(len(RANKS))) * 4 * decks)
+        #cards left when the cut card comes out
+        self.cut_card = len(self.cards) - int(len(self.cards) * penetration)
+        self.remaining = 0
+        self.counts = [0] * len(RANKS)
+        self.shuffles = 0
+
+    def __len__(self):
+        return self.remaining
+
+    def shuffle(self):
+        """
+        Puts every card back in the shoe and shuffles it
+        """
+        self.rng.shuffle(self.cards)
+        self.remaining = len(self.cards)
+        self.counts = [4 * self.decks] * len(RANKS)
+        self.shuffles += 1
+
+    def draw(self):
+        """
+        Draws a card and returns its code, shuffles if the shoe ran out
+        """
+        if not self.remaining:
+            self.shuffle()
+        self.remaining -= 1
+        card = self.cards[self.remaining]
+        self.counts[card] -= 1
+        return card
+
+    def draw_card(self):
+        """
+        Draws a card and returns its label, like Deck.draw_card
+        """
+        return RANKS[self.draw()]
+
+    def needs_shuffle(self):
+        """
+        Returns true once the cut card has been reached
+        """
+        return self.remaining <= self.cut_card
+
+
 class Hand(object):
+    """
+    Cards in a hand, with the value kept up to date in O(1) per card from
+    the hard total (aces as 1) and the number of aces
+    """
+    __slots__ = ('cards', 'hard', 'aces', 'value', 'soft')
+
+    #hand_values[hard][has ace] is (value, soft): one ace counts as 11
+    #whenever that does not bust the hand
+    hand_values = [[(hard, False), (hard + 10, True) if hard <= 11 else (hard, False)] for hard in range(32)]
+    #hard value of each card label, aces as 1
+    hard_values = dict((rank, value) for rank, value in zip(RANKS, HARD_VALUES))
+
     def __init__(self):
         self.cards = []
+        self.hard = 0
+        self.aces = 0
         self.value = 0
-        self.has_ace = False
+        self.soft = False
 
     def __len__(self):
         return len(self.cards)
@@ -50,59 +180,39 @@ class Hand(object):
         """
         Prints the hand, skipping first card if hidden
         """
-        #TODO list comp to print cards in this hand
-        hand = []
-        for card in range(starting_card, len(self.cards)):
-            hand.append(self.cards[card])
-        print(hand)
+        print(self.cards[starting_card:])
         if starting_card == 1:
             print('plus one face-down card')
 
     def add_card(self, card):
         """
-        Adds card to hand, recalculates value and returns numerical value
+        Adds card to hand, updates the value and returns it
         """
         self.cards.append(card)
+        self.hard += Hand.hard_values[card]
         if card == 'A':
-            has_ace = True
-        self.value = self.calc_value()
+            self.aces += 1
+        self.update_value()
         return self.value
 
+    def update_value(self):
+        if self.hard < 32:
+            self.value, self.soft = Hand.hand_values[self.hard][self.aces > 0]
+        else:
+            self.value, self.soft = self.hard, False
+
     def is_blackjack(self):
         """
         Returns true if hand contains a blackjack (ace plus 10)
         """
-        if len(self.cards) > 2 or self.value > 21:
-            return False
-
-        #keep track cards value
-        total = 0
-        for card in self.cards:
-            if self.get_card_value(card) >= 10:
-                total += self.get_card_value(card)
-
-        if total == 21:
-            return True
-        else:
-            return False
+        return self.value == 21 and len(self.cards) == 2
 
     def calc_value(self):
         """
         Returns the hand's numerical value
-        If there is an ace in the hand, it is treated as 11 unless the hand
-        busts, then it is treated as a 1
+        Aces count as 1, and one of them as 11 if that does not bust the hand
         """
-        total = 0
-        has_ace = 0
-        for card in self.cards:
-            total += self.get_card_value(card)
-            if card == 'A':
-                has_ace = 1
-        #check to see if you would bust due to Ace in that case recalc with ace value = 1
-        if has_ace and total > 21:
-            total = total - 10
-
-        return total
+        return self.value
 
     def get_card_value(self, card):
         """
@@ -114,8 +224,11 @@ class Hand(object):
         """
         Discards and entire hand
         """
-        while len(self.cards):
-            self.discard(self.cards[0])
+        self.cards = []
+        self.hard = 0
+        self.aces = 0
+        self.value = 0
+        self.soft = False
 
     def discard(self, card):
         """
@@ -123,15 +236,869 @@ class Hand(object):
         Also removes from hand
         """
         self.cards.remove(card)
+        self.hard -= Hand.hard_values[card]
+        if card == 'A':
+            self.aces -= 1
+        self.update_value()
+
+#what a round came to: outcome is 'player', 'dealer' or 'push', payout is
+#the player's net win (negative for a loss)
+RoundResult = namedtuple('RoundResult', ['outcome', 'payout', 'bet', 'player_cards', 'dealer_cards',
+                                         'player_value', 'dealer_value'])
+
+def mimic_dealer(hand, upcard):
+    """
+    Strategy that plays like the dealer, hitting until 17
+    """
+    return 'h' if hand.value < 17 else 's'
+
+class Engine(object):
+    """
+    Plays rounds of blackjack without any console I/O, for simulations
+    The player's moves come from a strategy function that is given the
+    player's hand and the dealer's face-up card and returns 'h' to hit or
+    's' to stand
+    """
+    def __init__(self, deck=None, blackjack_payout=1.5, counter=None):
+        #deck can be a Deck or a Shoe
+        self.deck = deck if deck is not None else Deck()
+        self.blackjack_payout = blackjack_payout
+        #a CardCounter is shown every card as a player at the table sees it
+        self.counter = counter
+
+    def play_rounds(self, strategy, rounds, bet=1):
+        """
+        Plays rounds rounds and yields a RoundResult for each
+        """
+        for i in range(rounds):
+            yield self.play_round(strategy, bet)
+
+    def play_round(self, strategy, bet=1):
+        """
+        Deals, plays and settles one round and returns its RoundResult
+        """
+        self.start_round()
+
+        draw = self.deck.draw_card
+        player_hand = Hand()
+        dealer_hand = Hand()
+        player_hand.add_card(draw())
+        dealer_hand.add_card(draw())
+        player_hand.add_card(draw())
+        dealer_hand.add_card(draw())
+        counter = self.counter
+        if counter is not None:
+            self.show(player_hand.cards + dealer_hand.cards[1:])
+
+        #a blackjack on either side ends the round right away
+        if not (player_hand.is_blackjack() or dealer_hand.is_blackjack()):
+            #the dealer's first card is the face-down one
+            upcard = dealer_hand.cards[1]
+            while player_hand.value < 21 and strategy(player_hand, upcard) == 'h':
+                player_hand.add_card(draw())
+                if counter is not None:
+                    self.show(player_hand.cards[-1:])
+
+            if player_hand.value <= 21:
+                self.dealer_move(dealer_hand)
+
+        if counter is not None:
+            #the hole card and the dealer's draws are turned over at the end
+            self.show(dealer_hand.cards[:1] + dealer_hand.cards[2:])
+
+        outcome, payout = self.settle(player_hand, dealer_hand)
+        return RoundResult(outcome, payout * bet, bet, player_hand.cards, dealer_hand.cards,
+                           player_hand.value, dealer_hand.value)
+
+    def start_round(self):
+        """
+        Shuffles if the deck asks for it, between rounds and never in the
+        middle of one. Call it before sizing a bet on the count, so the
+        count already reflects the shuffle
+        """
+        if self.deck.needs_shuffle():
+            self.deck.shuffle()
+        if self.counter is not None and self.counter.shuffles != self.deck.shuffles:
+            self.counter.reset()
+            self.counter.shuffles = self.deck.shuffles
+
+    def show(self, cards):
+        """
+        Shows cards to the counter, which starts over whenever the deck
+        has been shuffled since it last looked
+        """
+        if self.counter.shuffles != self.deck.shuffles:
+            self.counter.reset()
+            self.counter.shuffles = self.deck.shuffles
+        for card in cards:
+            self.counter.see(card)
+
+    def dealer_move(self, hand):
+        """
+        Dealer hits until 17 or more
+        """
+        while hand.value <= 16:
+            hand.add_card(self.deck.draw_card())
+
+    def settle(self, player_hand, dealer_hand):
+        """
+        Returns (outcome, payout) for a unit bet, ties are a push
+        """
+        player_blackjack = player_hand.is_blackjack()
+        dealer_blackjack = dealer_hand.is_blackjack()
+        if player_blackjack and dealer_blackjack:
+            return ('push', 0)
+        if player_blackjack:
+            return ('player', self.blackjack_payout)
+        if dealer_blackjack:
+            return ('dealer', -1)
+
+        #a player bust loses even if the dealer would have bust too
+        if player_hand.value > 21:
+            return ('dealer', -1)
+        if dealer_hand.value > 21 or player_hand.value > dealer_hand.value:
+            return ('player', 1)
+        if player_hand.value == dealer_hand.value:
+            return ('push', 0)
+        return ('dealer', -1)
+
+def hit_table(stand_on=17):
+    """
+    Returns a strategy table that hits every total below stand_on
+    table[soft][total][upcard] is True to hit: soft is 0 or 1, total is the
+    hand's value and upcard the value of the dealer's up card (2-11, ace 11)
+    """
+    return [[[total < stand_on for upcard in range(12)] for total in range(32)] for soft in range(2)]
+
+class SimulationStats(object):
+    """
+    Streaming statistics over simulated hands: outcome counts, a histogram
+    of payouts and the running mean and variance of the payout per hand
+    Two of them merge exactly, so batches can be summarized one at a time
+    """
+    def __init__(self):
+        self.hands = 0
+        self.mean = 0.0
+        #sum of squared differences from the mean
+        self.m2 = 0.0
+        self.outcomes = dict((outcome, 0) for outcome in OUTCOMES)
+        self.blackjacks = 0
+        self.payouts = {}
+
+    def add(self, payout, outcome, blackjack=False):
+        """
+        Adds a single hand
+        """
+        self.hands += 1
+        delta = payout - self.mean
+        self.mean += delta / self.hands
+        self.m2 += delta * (payout - self.mean)
+        self.outcomes[outcome] += 1
+        self.blackjacks += blackjack
+        self.payouts[payout] = self.payouts.get(payout, 0) + 1
+
+    def merge(self, other):
+        """
+        Folds other's hands into these statistics
+        """
+        hands = self.hands + other.hands
+        if not hands:
+            return self
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.hands * other.hands / hands
+        self.mean += delta * other.hands / hands
+        self.hands = hands
+        for outcome, count in other.outcomes.items():
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+        self.blackjacks += other.blackjacks
+        for payout, count in other.payouts.items():
+            self.payouts[payout] = self.payouts.get(payout, 0) + count
+        return self
+
+    def variance(self):
+        return self.m2 / (self.hands - 1) if self.hands > 1 else 0.0
+
+    def confidence_interval(self, confidence=0.95):
+        """
+        Returns (low, high) bounds on the expected payout per hand
+        """
+        from statistics import NormalDist
+
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        margin = z * math.sqrt(self.variance() / self.hands) if self.hands else float('inf')
+        return (self.mean - margin, self.mean + margin)
+
+    def summary(self, confidence=0.95):
+        """
+        Returns the statistics as a dict, house edge is the player's
+        expected loss per unit bet
+        """
+        low, high = self.confidence_interval(confidence)
+        return {
+            'hands': self.hands,
+            'expected_payout': self.mean,
+            'house_edge': -self.mean,
+            'stdev': math.sqrt(self.variance()),
+            'confidence': confidence,
+            'interval': (low, high),
+            'outcomes': dict((outcome, count / self.hands if self.hands else 0.0)
+                             for outcome, count in self.outcomes.items()),
+            'blackjacks': self.blackjacks / self.hands if self.hands else 0.0,
+            'payouts': dict((payout, self.payouts[payout] / self.hands) for payout in sorted(self.payouts)),
+        }
+
+def simulate_batch(hands, table=None, decks=6, blackjack_payout=1.5, seed=None, batch_size=100000):
+    """
+    Plays hands hands of a fixed strategy table (see hit_table) with NumPy
+    and returns their SimulationStats. Each hand is dealt from its own
+    freshly shuffled shoe of decks decks, like a continuous shuffler, with
+    the same rules as Engine: dealer stands on 17, blackjack pays
+    blackjack_payout and ties push
+    Hands are played batch_size at a time, each batch with its own random
+    stream spawned from seed, so a seed always gives the same result
+    """
+    import numpy as np
+
+    table = np.asarray(table if table is not None else hit_table(), dtype=bool)
+    stats = SimulationStats()
+    for seed_sequence, size in split_hands(hands, seed, batch_size):
+        stats.merge(simulate_hands(np.random.default_rng(seed_sequence), size, table, decks, blackjack_payout))
+    return stats
+
+def split_hands(hands, seed=None, batch_size=100000):
+    """
+    Splits hands into batches and returns (SeedSequence, hands) for each
+    The streams depend only on seed and batch_size, never on who plays them
+    """
+    import numpy as np
+
+    batches = -(-hands // batch_size)
+    return [(seed_sequence, min(batch_size, hands - index * batch_size))
+            for index, seed_sequence in enumerate(np.random.SeedSequence(seed).spawn(batches))]
+
+def simulate_parallel(hands, processes=None, strategy=None, table=None, decks=6, blackjack_payout=1.5,
+                      seed=None, batch_size=100000):
+    """
+    Runs a simulation over a pool of processes and returns its
+    SimulationStats. With a strategy function (it has to be defined at
+    module level to reach the workers) hands are played one by one on an
+    Engine with a Shoe, otherwise the table is played with NumPy as in
+    simulate_batch
+    The hands are split into batches that each get their own random stream
+    spawned from seed, and the batch results are merged in order, so a seed
+    gives identical results for any number of processes
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if strategy is None:
+        play = play_table_batch
+        rules = (table if table is not None else hit_table(), decks, blackjack_payout)
+    else:
+        play = play_engine_batch
+        rules = (strategy, decks, blackjack_payout)
+
+    batches = split_hands(hands, seed, batch_size)
+    stats = SimulationStats()
+    with ProcessPoolExecutor(processes) as executor:
+        for batch_stats in executor.map(play, batches, [rules] * len(batches)):
+            stats.merge(batch_stats)
+    return stats
+
+def play_table_batch(batch, rules):
+    """
+    Worker for simulate_parallel, plays a batch with simulate_hands
+    """
+    import numpy as np
+
+    seed_sequence, hands = batch
+    table, decks, blackjack_payout = rules
+    return simulate_hands(np.random.default_rng(seed_sequence), hands, np.asarray(table, dtype=bool),
+                          decks, blackjack_payout)
+
+def play_engine_batch(batch, rules):
+    """
+    Worker for simulate_parallel, plays a batch round by round on an Engine
+    """
+    seed_sequence, hands = batch
+    strategy, decks, blackjack_payout = rules
+
+    #random.Random seeded from the batch's stream
+    rng = random.Random(int.from_bytes(seed_sequence.generate_state(8).tobytes(), 'little'))
+    engine = Engine(Shoe(decks, rng=rng), blackjack_payout)
+    stats = SimulationStats()
+    for result in engine.play_rounds(strategy, hands):
+        blackjack = result.player_value == 21 and len(result.player_cards) == 2
+        stats.add(result.payout, result.outcome, blackjack)
+    return stats
+
+def simulate_hands(rng, hands, table, decks=6, blackjack_payout=1.5):
+    """
+    Plays one batch for simulate_batch, every hand in lockstep as a row
+    of NumPy arrays, and returns its SimulationStats
+    """
+    import numpy as np
+
+    hard_values = np.asarray(HARD_VALUES, dtype=np.int16)
+    rows = np.arange(hands)
+
+    #each row is one shoe as the count of every rank left in it. Cards are
+    #drawn from it as needed, which deals the same as shuffling the whole
+    #shoe but only costs the few cards a round uses
+    shoes = np.full((hands, len(RANKS)), 4 * decks, dtype=np.int16)
+
+    def draw(index):
+        counts = shoes[index].cumsum(axis=1)
+        pick = (rng.random(len(index)) * counts[:, -1]).astype(np.int16)
+        cards = (counts <= pick[:, None]).sum(axis=1)
+        shoes[index, cards] -= 1
+        return hard_values[cards], cards == 0
+
+    def best(hard, ace_count):
+        soft = (ace_count > 0) & (hard <= 11)
+        return hard + 10 * soft, soft
+
+    #dealt in Engine's order: player, dealer, player, dealer (up card)
+    dealt = [draw(rows) for i in range(4)]
+    player_hard = dealt[0][0] + dealt[2][0]
+    player_aces = dealt[0][1].astype(np.int16) + dealt[2][1]
+    dealer_hard = dealt[1][0] + dealt[3][0]
+    dealer_aces = dealt[1][1].astype(np.int16) + dealt[3][1]
+    upcard = np.where(dealt[3][1], 11, dealt[3][0])
+
+    player_total, player_soft = best(player_hard, player_aces)
+    dealer_total, dealer_soft = best(dealer_hard, dealer_aces)
+    player_blackjack = player_total == 21
+    dealer_blackjack = dealer_total == 21
+
+    #players hit while the table says so, hands drop out when they stand or bust
+    playing = ~(player_blackjack | dealer_blackjack)
+    while True:
+        hit = playing & table[player_soft.astype(np.intp), player_total, upcard]
+        if not hit.any():
+            break
+        index = rows[hit]
+        value, ace = draw(index)
+        player_hard[index] += value
+        player_aces[index] += ace
+        player_total, player_soft = best(player_hard, player_aces)
+        playing = hit & (player_total < 21)
+
+    #dealer hits 16 or less, only against players still in the round
+    playing = ~(player_blackjack | dealer_blackjack) & (player_total <= 21)
+    while True:
+        hit = playing & (dealer_total <= 16)
+        if not hit.any():
+            break
+        index = rows[hit]
+        value, ace = draw(index)
+        dealer_hard[index] += value
+        dealer_aces[index] += ace
+        dealer_total, dealer_soft = best(dealer_hard, dealer_aces)
+        playing = hit
+
+    #settled in the same order as Engine.settle
+    conditions = [player_blackjack & dealer_blackjack, player_blackjack, dealer_blackjack,
+                  player_total > 21, (dealer_total > 21) | (player_total > dealer_total),
+                  player_total == dealer_total]
+    payouts = np.select(conditions, [0, blackjack_payout, -1, -1, 1, 0], -1).astype(np.float64)
+    outcomes = np.select(conditions, [2, 0, 1, 1, 0, 2], 1)
+
+    stats = SimulationStats()
+    stats.hands = hands
+    stats.mean = float(payouts.mean())
+    stats.m2 = float(((payouts - stats.mean) ** 2).sum())
+    for code, count in enumerate(np.bincount(outcomes, minlength=len(OUTCOMES))):
+        stats.outcomes[OUTCOMES[code]] = int(count)
+    stats.blackjacks = int(player_blackjack.sum())
+    for payout, count in zip(*np.unique(payouts, return_counts=True)):
+        stats.payouts[float(payout)] = int(count)
+    return stats
+
+def add_card_value(total, soft, value):
+    """
+    Returns (total, soft) of a hand after adding a card of value (ace 1)
+    soft means an ace in the hand is counted as 11
+    """
+    if value == 1 and total + 11 <= 21:
+        return (total + 11, True)
+    total += value
+    if total > 21 and soft:
+        return (total - 10, False)
+    return (total, soft)
+
+#ADD_CARD[total][soft][value - 1] is add_card_value(total, soft, value)
+ADD_CARD = [[[add_card_value(total, soft, value) for value in range(1, 11)] for soft in (False, True)]
+            for total in range(32)]
+
+def value_composition(counts):
+    """
+    Returns the composition of a shoe as a tuple of how many cards of each
+    value 1 (ace) to 10 are left, from the per-rank counts of a Shoe
+    """
+    return tuple(counts[:9]) + (sum(counts[9:]),)
+
+class StrategySolver(object):
+    """
+    Exact expected values of hitting and standing, worked out recursively
+    over the cards left in the shoe, for the rules Engine plays: dealer
+    stands on 17 and a dealer blackjack ends the round before the player
+    acts (so the dealer's hole card is never the one that makes blackjack)
+    A composition is a tuple of how many cards of each value 1 (ace) to
+    10 are left. Dealer outcome distributions and the player's best EV are
+    memoized by (total, soft, composition), in LRU caches of cache_size
+    entries, which is what makes a full table take seconds
+    With deplete False every card is drawn at the odds of the composition
+    asked about, leaving out how the cards already drawn in the hand shift
+    them. That is the fast approximation CardCounter uses: the dealer's
+    outcomes are then worked out once per up card and composition, and
+    every player total reuses them
+    """
+    def __init__(self, decks=6, composition=None, cache_size=1 << 20, deplete=True):
+        if composition is None:
+            composition = [4 * decks] * 9 + [16 * decks]
+        self.composition = tuple(composition)
+        self.deplete = deplete
+        self.dealer_outcomes = lru_cache(maxsize=cache_size)(self._dealer_outcomes)
+        self.dealer_finals = lru_cache(maxsize=cache_size)(self._dealer_finals)
+        self.best_ev = lru_cache(maxsize=cache_size)(self._best_ev)
+
+    def strategy_table(self):
+        """
+        Returns a hit/stand table in the format of hit_table, usable by
+        simulate_batch or, through TableStrategy, by Engine
+        Each entry is solved for the full shoe less the dealer's up card
+        """
+        table = hit_table(0)
+        for upcard in range(1, 11):
+            composition = self.remove(self.composition, upcard)
+            for soft, totals in ((0, range(4, 21)), (1, range(12, 21))):
+                for total in totals:
+                    hit, stand = self.expected_values(total, soft, upcard, composition)
+                    table[soft][total][11 if upcard == 1 else upcard] = hit > stand
+        return table
+
+    def expected_values(self, total, soft, upcard, composition=None):
+        """
+        Returns (hit EV, stand EV) per unit bet for a hand of total against
+        the dealer's up card value (ace 1), drawing from composition
+        """
+        if composition is None:
+            composition = self.composition
+        return (self.hit_ev(total, bool(soft), composition, upcard), self.stand_ev(total, composition, upcard))
+
+    def stand_ev(self, total, composition, upcard):
+        if total > 21:
+            return -1.0
+        outcomes = self.dealer_finals(upcard, composition)
+
+        #outcomes are the chances of the dealer ending on 17-21, then bust
+        ev = outcomes[5]
+        for dealer_total in range(17, 22):
+            if dealer_total < total:
+                ev += outcomes[dealer_total - 17]
+            elif dealer_total > total:
+                ev -= outcomes[dealer_total - 17]
+        return ev
+
+    def hit_ev(self, total, soft, composition, upcard):
+        cards = sum(composition)
+        moves = ADD_CARD[total][soft]
+        ev = 0.0
+        for index, count in enumerate(composition):
+            if count:
+                new_total, new_soft = moves[index]
+                #busts are settled here rather than cached
+                if new_total > 21:
+                    ev -= count / cards
+                else:
+                    ev += count / cards * self.best_ev(new_total, new_soft, self.draw(composition, index + 1), upcard)
+        return ev
+
+    def _best_ev(self, total, soft, composition, upcard):
+        if total > 21:
+            return -1.0
+        stand = self.stand_ev(total, composition, upcard)
+        if total == 21:
+            return stand
+        return max(stand, self.hit_ev(total, soft, composition, upcard))
+
+    def _dealer_finals(self, upcard, composition):
+        """
+        Returns dealer_outcomes for a dealer showing upcard, cached by
+        (upcard, composition) since every player total stands against it
+        """
+        #peek: the hole card cannot give the dealer a blackjack
+        excluded = 10 if upcard == 1 else (1 if upcard == 10 else 0)
+        return self.dealer_outcomes(11 if upcard == 1 else upcard, upcard == 1, composition, excluded)
+
+    def _dealer_outcomes(self, total, soft, composition, excluded=0):
+        """
+        Returns the chances of the dealer, at total, finishing on 17, 18,
+        19, 20, 21 or busting, drawing from composition without a card of
+        value excluded
+        """
+        cards = sum(composition) - (composition[excluded - 1] if excluded else 0)
+        moves = ADD_CARD[total][soft]
+        outcomes = [0.0] * 6
+        for index, count in enumerate(composition):
+            if not count or index + 1 == excluded:
+                continue
+            chance = count / cards
+            new_total, new_soft = moves[index]
+            #finished hands are counted here rather than cached
+            if new_total > 21:
+                outcomes[5] += chance
+            elif new_total >= 17:
+                outcomes[new_total - 17] += chance
+            else:
+                rest = self.dealer_outcomes(new_total, new_soft, self.draw(composition, index + 1))
+                outcomes = [outcome + chance * final for outcome, final in zip(outcomes, rest)]
+        return tuple(outcomes)
+
+    def draw(self, composition, value):
+        """
+        Returns the composition the next card is drawn from after a card of
+        value has been drawn
+        """
+        return self.remove(composition, value) if self.deplete else composition
+
+    @staticmethod
+    def remove(composition, value):
+        """
+        Returns composition less one card of value
+        """
+        return composition[:value - 1] + (composition[value - 1] - 1,) + composition[value:]
+
+class TableStrategy(object):
+    """
+    Engine strategy that plays a hit/stand table from hit_table or
+    StrategySolver.strategy_table
+    """
+    def __init__(self, table):
+        self.table = table
+
+    def __call__(self, hand, upcard):
+        return 'h' if self.table[hand.soft][hand.value][Deck.card_values[upcard]] else 's'
+
+class CardCounter(object):
+    """
+    Counts the cards seen since the last shuffle under several counting
+    systems (see COUNTING_SYSTEMS) and keeps how many of each rank are
+    still unseen, so it can give true counts and the
+    composition-dependent EV of the decision at hand
+    EVs come from a StrategySolver that draws every card, the player's and
+    the dealer's, at the odds of the unseen cards when asked, which leaves
+    out how the cards of the rest of the hand shift them (the depleting
+    solver has it exactly, at a far higher cost). Its caches are keyed by
+    the unseen composition, so the dealer's outcomes are worked out once
+    per up card and shoe state and shared by every hand. Unbalanced
+    systems (KO) start at 4 - 4 * decks so they are 0 around the pivot,
+    balanced ones start at 0
+    """
+    def __init__(self, decks=6, systems=('hi-lo', 'ko', 'omega-ii'), cache_size=1 << 16):
+        self.decks = decks
+        self.systems = dict((name, COUNTING_SYSTEMS[name]) for name in systems)
+        self.solver = StrategySolver(decks, cache_size=cache_size, deplete=False)
+        self.shuffles = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Starts over with a freshly shuffled shoe
+        """
+        self.unseen = [4 * self.decks] * len(RANKS)
+        self.cards_left = 52 * self.decks
+        self.counts = dict((name, -4 * sum(tags) * (self.decks - 1)) for name, tags in self.systems.items())
+
+    def see(self, card):
+        """
+        Counts a card (label or code) that has been turned face up
+        """
+        code = RANK_CODES[card] if isinstance(card, str) else card
+        self.unseen[code] -= 1
+        self.cards_left -= 1
+        for name, tags in self.systems.items():
+            self.counts[name] += tags[code]
+
+    def running_count(self, system='hi-lo'):
+        return self.counts[system]
+
+    def decks_left(self):
+        return self.cards_left / 52.0
+
+    def true_count(self, system='hi-lo'):
+        """
+        Returns the running count per deck still unseen
+        """
+        return self.counts[system] / max(self.decks_left(), 0.5)
+
+    def composition(self):
+        """
+        Returns the unseen cards in StrategySolver's composition format
+        """
+        return value_composition(self.unseen)
+
+    def expected_values(self, hand, upcard):
+        """
+        Returns (hit EV, stand EV) for hand against the dealer's up card,
+        given the cards not seen yet
+        """
+        upcard = HARD_VALUES[RANK_CODES[upcard]] if isinstance(upcard, str) else upcard
+        return self.solver.expected_values(hand.value, hand.soft, upcard, self.composition())
+
+    def strategy(self, hand, upcard):
+        """
+        Engine strategy that makes the play with the higher EV
+        """
+        hit, stand = self.expected_values(hand, upcard)
+        return 'h' if hit > stand else 's'
+
+class FlatBet(object):
+    """
+    Betting system that always bets the same
+    """
+    def __init__(self, unit=1):
+        self.unit = unit
+
+    def __call__(self, bankroll, counter):
+        return self.unit
+
+class CountSpread(object):
+    """
+    Betting system that raises the bet with the true count: ramp is a list
+    of (true count, units), the bet is unit times the units of the highest
+    true count reached, or one unit below them all
+    """
+    def __init__(self, unit=1, ramp=((2, 2), (3, 4), (4, 8)), system='hi-lo'):
+        self.unit = unit
+        self.ramp = sorted(ramp)
+        self.system = system
+
+    def __call__(self, bankroll, counter):
+        true_count = math.floor(counter.true_count(self.system))
+        units = 1
+        for count, count_units in self.ramp:
+            if true_count >= count:
+                units = count_units
+        return self.unit * units
+
+class KellyBet(object):
+    """
+    Betting system that bets fraction of the Kelly bet, bankroll * edge /
+    variance, with the player's edge estimated from the true count as
+    base_edge + edge_per_count * true count. Bets minimum when there is no
+    edge. The defaults are the usual Hi-Lo rule of thumb
+    """
+    def __init__(self, fraction=0.5, base_edge=-0.005, edge_per_count=0.005, variance=1.3, minimum=1,
+                 system='hi-lo'):
+        self.fraction = fraction
+        self.base_edge = base_edge
+        self.edge_per_count = edge_per_count
+        self.variance = variance
+        self.minimum = minimum
+        self.system = system
+
+    def __call__(self, bankroll, counter):
+        edge = self.base_edge + self.edge_per_count * counter.true_count(self.system)
+        if edge <= 0:
+            return self.minimum
+        return max(self.minimum, self.fraction * bankroll * edge / self.variance)
+
+class Histogram(object):
+    """
+    Fixed-bin histogram of values between low and high, with the running
+    mean and variance, in constant memory. Values outside the range are
+    counted at its ends. Two with the same bins merge exactly
+    """
+    def __init__(self, low, high, bins=200):
+        self.low = low
+        self.high = high
+        self.width = (high - low) / float(bins)
+        self.counts = [0] * bins
+        self.below = 0
+        self.above = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.total += 1
+        delta = value - self.mean
+        self.mean += delta / self.total
+        self.m2 += delta * (value - self.mean)
+        if value < self.low:
+            self.below += 1
+        elif value >= self.high:
+            self.above += 1
+        else:
+            self.counts[int((value - self.low) / self.width)] += 1
+
+    def merge(self, other):
+        total = self.total + other.total
+        if not total:
+            return self
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.total * other.total / total
+        self.mean += delta * other.total / total
+        self.total = total
+        self.below += other.below
+        self.above += other.above
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        return self
+
+    def stdev(self):
+        return math.sqrt(self.m2 / (self.total - 1)) if self.total > 1 else 0.0
+
+    def percentile(self, percent):
+        """
+        Returns the value below which percent of the values fall, to within
+        a bin, and low or high if it falls outside the range
+        """
+        rank = percent / 100.0 * self.total
+        seen = self.below
+        if rank <= seen:
+            return self.low
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank:
+                return self.low + self.width * (index + (rank - seen) / count)
+            seen += count
+        return self.high
+
+class BankrollStats(object):
+    """
+    Streaming results of many bankroll sessions: how many were ruined, the
+    final bankroll, the largest drawdown and the bankroll at checkpoints
+    every few rounds, each as a Histogram
+    """
+    def __init__(self, bankroll, rounds, checkpoints=10, bins=200):
+        self.bankroll = bankroll
+        self.sessions = 0
+        self.ruined = 0
+        self.hands = 0
+        self.wagered = 0.0
+        self.final = Histogram(0, 4 * bankroll, bins)
+        self.drawdowns = Histogram(0, 2 * bankroll, bins)
+        step = max(1, rounds // checkpoints)
+        self.checkpoints = list(range(step, rounds + 1, step))
+        self.curve = [Histogram(0, 4 * bankroll, bins) for checkpoint in self.checkpoints]
+
+    def merge(self, other):
+        self.sessions += other.sessions
+        self.ruined += other.ruined
+        self.hands += other.hands
+        self.wagered += other.wagered
+        self.final.merge(other.final)
+        self.drawdowns.merge(other.drawdowns)
+        for mine, theirs in zip(self.curve, other.curve):
+            mine.merge(theirs)
+        return self
+
+    def summary(self, percents=(5, 25, 50, 75, 95)):
+        """
+        Returns the results as a dict, percentiles are interpolated within
+        histogram bins
+        """
+        return {
+            'sessions': self.sessions,
+            'risk_of_ruin': self.ruined / self.sessions if self.sessions else 0.0,
+            'hands': self.hands,
+            'average_bet': self.wagered / self.hands if self.hands else 0.0,
+            'final_mean': self.final.mean,
+            'final_stdev': self.final.stdev(),
+            'final_percentiles': dict((percent, self.final.percentile(percent)) for percent in percents),
+            'drawdown_mean': self.drawdowns.mean,
+            'drawdown_percentiles': dict((percent, self.drawdowns.percentile(percent)) for percent in percents),
+            'curve': [(checkpoint, dict((percent, histogram.percentile(percent)) for percent in percents))
+                      for checkpoint, histogram in zip(self.checkpoints, self.curve)],
+        }
+
+def simulate_bankroll(sessions, rounds, betting, strategy=mimic_dealer, bankroll=100, min_bet=1, max_bet=None,
+                      decks=6, penetration=0.75, blackjack_payout=1.5, checkpoints=10, seed=None,
+                      processes=1, batch_size=1000):
+    """
+    Plays sessions sessions of up to rounds rounds each, starting from
+    bankroll with a fresh shoe, and returns their BankrollStats. betting is
+    called as betting(bankroll, counter) before every round (counter is a
+    CardCounter for count-based systems, otherwise None) and the bet is
+    kept between min_bet and max_bet and never above the bankroll. A
+    session is ruined once the bankroll drops below min_bet
+    Sessions are split into batches with their own random streams from seed,
+    played on processes processes (strategy and betting have to pickle for
+    more than one) and merged in order, so a seed always gives the same
+    results
+    """
+    rules = (rounds, betting, strategy, bankroll, min_bet, max_bet, decks, penetration, blackjack_payout,
+             checkpoints)
+    batches = split_hands(sessions, seed, batch_size)
+    stats = BankrollStats(bankroll, rounds, checkpoints)
+    if processes == 1:
+        for batch in batches:
+            stats.merge(play_sessions(batch, rules))
+        return stats
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(processes) as executor:
+        for batch_stats in executor.map(play_sessions, batches, [rules] * len(batches)):
+            stats.merge(batch_stats)
+    return stats
+
+def play_sessions(batch, rules):
+    """
+    Worker for simulate_bankroll, plays a batch of sessions
+    """
+    seed_sequence, sessions = batch
+    (rounds, betting, strategy, bankroll, min_bet, max_bet, decks, penetration, blackjack_payout,
+     checkpoints) = rules
+
+    rng = random.Random(int.from_bytes(seed_sequence.generate_state(8).tobytes(), 'little'))
+    system = getattr(betting, 'system', None)
+    counter = CardCounter(decks, (system,)) if system is not None else None
+    engine = Engine(Shoe(decks, penetration, rng), blackjack_payout, counter)
+    stats = BankrollStats(bankroll, rounds, checkpoints)
+    next_checkpoint = dict((checkpoint, index) for index, checkpoint in enumerate(stats.checkpoints))
+
+    for session in range(sessions):
+        #every session starts from a fresh shoe
+        engine.deck.shuffle()
+        money = peak = bankroll
+        drawdown = 0
+        ruined = False
+        for round_number in range(1, rounds + 1):
+            if not ruined:
+                engine.start_round()
+                bet = max(betting(money, counter), min_bet)
+                if max_bet is not None:
+                    bet = min(bet, max_bet)
+                bet = min(bet, money)
+
+                money += engine.play_round(strategy, bet).payout
+                stats.hands += 1
+                stats.wagered += bet
+                peak = max(peak, money)
+                drawdown = max(drawdown, peak - money)
+                ruined = money < min_bet
+
+            #a ruined session keeps its last bankroll for the later checkpoints
+            if round_number in next_checkpoint:
+                stats.curve[next_checkpoint[round_number]].add(money)
+            if ruined and round_number > stats.checkpoints[-1]:
+                break
+
+        stats.sessions += 1
+        stats.ruined += ruined
+        stats.final.add(money)
+        stats.drawdowns.add(drawdown)
+    return stats
 
 class Game(object):
     """
-    Tracks game variables including player input, wallet and winning/losing scenarios
+    Console front-end: asks for bets and moves, plays them on an Engine
+    and tracks the wallet
     """
     def __init__(self):
         self.deck = Deck()
-        self.player_hand = Hand()
-        self.dealer_hand = Hand()
+        self.engine = Engine(self.deck)
         self.current_bet = 0
         self.start_new_game(self.deck)
 
@@ -140,7 +1107,6 @@ class Game(object):
         Starts a new game by entering the play loop
         """
         print ('Welcome to PyBlackjack!')
-        game_on = True
         self.deck.shuffle()
 
         #play/replay loop
@@ -148,56 +1114,53 @@ class Game(object):
             #main game loop
             self.init_wallet()
 
-            while self.wallet > 0 and game_on:
+            #3:2 blackjacks can leave a fraction of a unit, too little to bet
+            while self.wallet >= 1:
                 #ask player how much they would like to bet
                 self.current_bet = self.get_player_input('bet')
-                self.TEST_deal_first_hand(self.deck)
-
-                #check for blackjack on the first hand
-                if self.dealer_hand.is_blackjack() or self.player_hand.is_blackjack():
-                    winner = self.calculate_winner(self.player_hand, self.dealer_hand)
-                    print('%s is the winner!' %(winner))
-
-                move = ' '
-
-                #ask player what they would like to do (hit or stand)
-                while move != 's':
-                    if self.is_bust(self.player_hand) or self.is_bust(self.dealer_hand):
-                        break
-
-                    if self.player_hand.is_blackjack() or self.dealer_hand.is_blackjack():
-                        print('Blackjack!')
-                        break
-
-                    move = str.lower(self.get_player_input('move'))
-
-                    if move == 'h':
-                        print('You hit')
-                        self.hit(self.player_hand)
-                    else:
-                        print('You stand')
-                        break
-
-                self.end_of_turn()
+                shuffles = self.deck.shuffles
+                print('Dealer deals the first hand')
+                result = self.engine.play_round(self.player_move, self.current_bet)
+                if self.deck.shuffles != shuffles:
+                    print('Dealer had to shuffle the deck')
+                self.end_of_turn(result)
 
             if not self.replay():
-                game_on = False
                 print('Thanks for playing!')
                 break
 
-    def end_of_turn(self):
-        self.dealer_move(self.dealer_hand)
+    def player_move(self, hand, upcard):
+        """
+        Strategy that asks the player, used by the engine for every move
+        """
+        print('Your hand:')
+        hand.print_hand()
+        print('Dealers hand:')
+        print([upcard])
+        print('plus one face-down card')
+
+        move = str.lower(self.get_player_input('move'))
+        if move == 'h':
+            print('You hit')
+        else:
+            print('You stand')
+        return move
+
+    def end_of_turn(self, result):
         print('Your hand:')
-        self.player_hand.print_hand()
+        print(result.player_cards)
         print('Dealers hand:')
-        self.dealer_hand.print_hand()
-        winner = self.calculate_winner(self.player_hand, self.dealer_hand)
-        if winner == 'Bust':
+        print(result.dealer_cards)
+        print('Player hand value: %s' %(result.player_value))
+        print('Dealer hand value: %s' %(result.dealer_value))
+
+        if result.player_value > 21:
             print('Bust!')
+        if result.outcome == 'push':
+            print('Push, your bet is returned')
         else:
-            print('%s is the winner!' %(winner))
-        self.adjust_wallet(self.current_bet, winner)
-        self.discard_hands()
+            print('%s is the winner!' %(result.outcome.capitalize()))
+        self.adjust_wallet(result.payout)
         self.print_wallet()
 
     def init_wallet(self):
@@ -213,31 +1176,14 @@ class Game(object):
             else:
                 return False
 
-    def dealer_move(self, hand):
-        print('Dealer decides his move')
-        while hand.value <= 16:
-            print('Dealer hits')
-            self.hit(hand)
-        else:
-            print('Dealer stands')
-
-    def is_bust(self, hand):
-        '''
-        Returns true if hand is over 21
-        '''
-        if hand.value > 21:
-            return True
-        else:
-            return False
-
-    def adjust_wallet(self, current_bet, winner):
+    def adjust_wallet(self, payout):
         """
-        Adjusts the wallet based on whether player won or lost and their current bet
+        Adjusts the wallet by what the player won or lost on the round
         """
-        if winner == 'Player':
-            self.increase_wallet(current_bet*2)
+        if payout > 0:
+            self.increase_wallet(payout)
         else:
-            self.decrease_wallet(current_bet)
+            self.decrease_wallet(-payout)
 
     def print_wallet(self):
         """
@@ -245,70 +1191,6 @@ class Game(object):
         """
         print('Current wallet amount is $%s' %(self.wallet))
 
-    def calculate_winner(self, player_hand, dealer_hand):
-        '''
-        Returns False if no winner
-        Returns player or dealer if one is a winner
-        '''
-        player_hand_value = player_hand.value
-        dealer_hand_value = dealer_hand.value
-        print('Player hand value: %s' %(player_hand_value))
-        print('Dealer hand value: %s' %(dealer_hand_value))
-
-        #did both player and dealer go bust?
-        if self.is_bust(player_hand) and self.is_bust(dealer_hand):
-            return 'Bust'
-
-        #did dealer go bust?
-        if self.is_bust(dealer_hand):
-            return 'Player'
-
-        #did player go bust?
-        if self.is_bust(player_hand):
-            return 'Dealer'
-
-        #is player or dealer hand a blackjack?
-        if dealer_hand.is_blackjack():
-            return 'Dealer'
-
-        if player_hand.is_blackjack():
-            return 'Player'
-
-        if dealer_hand_value >= player_hand_value:
-            return 'Dealer'
-        else:
-            return 'Player'
-
-    def discard_hands(self):
-        """
-        Discards all hands (player and dealer)
-        """
-        self.player_hand.discard_hand()
-        self.dealer_hand.discard_hand()
-
-    def deal_first_hand(self, deck):
-        """
-        Deals the first hand
-        """
-        print('Dealer deals the first hand')
-        self.player_hand.add_card(deck.draw_card())
-        self.dealer_hand.add_card(deck.draw_card())
-        self.player_hand.add_card(deck.draw_card())
-        self.dealer_hand.add_card(deck.draw_card())
-        print('Your hand:')
-        self.player_hand.print_hand(0)
-        print('Dealers Hand:')
-        self.dealer_hand.print_hand(1)
-
-    def hit(self, hand):
-        """
-        A card is pulled into the hand. Steps:
-        - check for blackjack (win)
-        - check for over 21 (bust)
-        """
-        hand.add_card(self.deck.draw_card())
-        hand.print_hand()
-
     def get_player_input(self, type):
         if type == 'bet':
             player_bet = ' '
@@ -348,92 +1230,7 @@ class Game(object):
     def decrease_wallet(self, amount):
         self.wallet -= amount
 
-    def TEST_deal_first_hand(self, deck):
-        """
-        Various tests to test the winning calc function
-        Uncomment the desired test and change deal_first_hand() in game loop
-        to TEST_deal_first_hand(). Stand when given the option during gameplay
-        """
-        print('Dealer deals test hand (player has blackjack)')
-
-        #test for player blackjack
-        '''
-        self.player_hand.add_card('A')
-        self.dealer_hand.add_card(deck.draw_card())
-        self.player_hand.add_card('K')
-        self.dealer_hand.add_card(deck.draw_card())
-        '''
-        #test for dealer blackjack
-        '''
-        self.player_hand.add_card(deck.draw_card())
-        self.dealer_hand.add_card('A')
-        self.player_hand.add_card(deck.draw_card())
-        self.dealer_hand.add_card('K')
-        '''
-
-        #test for both have blackjack
-        '''
-        self.player_hand.add_card('10')
-        self.dealer_hand.add_card('A')
-        self.player_hand.add_card('A')
-        self.dealer_hand.add_card('K')
-        '''
-
-        #test for both bust
-        '''
-        self.player_hand.add_card('10')
-        self.player_hand.add_card('10')
-        self.player_hand.add_card('4')
-        self.dealer_hand.add_card('4')
-        self.dealer_hand.add_card('K')
-        self.dealer_hand.add_card('K')
-        '''
-
-        #test for player bust
-        '''
-        self.player_hand.add_card('10')
-        self.player_hand.add_card('10')
-        self.player_hand.add_card('4')
-        self.dealer_hand.add_card('4')
-        self.dealer_hand.add_card('K')
-        '''
-        #test for dealer bust
-        '''
-        self.player_hand.add_card('10')
-        self.player_hand.add_card('2')
-        self.player_hand.add_card('4')
-        self.dealer_hand.add_card('4')
-        self.dealer_hand.add_card('K')
-        self.dealer_hand.add_card('K')
-        '''
-        #test for tie
-        '''
-        self.player_hand.add_card('10')
-        self.player_hand.add_card('8')
-        self.dealer_hand.add_card('10')
-        self.dealer_hand.add_card('8')
-        '''
-
-        #test for player wins
-        '''
-        self.player_hand.add_card('10')
-        self.player_hand.add_card('K')
-        self.dealer_hand.add_card('10')
-        self.dealer_hand.add_card('8')
-        '''
-
-        #test for dealer wins
-        '''
-        self.player_hand.add_card('2')
-        self.player_hand.add_card('2')
-        self.dealer_hand.add_card('10')
-        self.dealer_hand.add_card('8')
-        '''
-
-        print('TEST Your hand:')
-        self.player_hand.print_hand()
-        print('TEST Dealers hand:')
-        self.dealer_hand.print_hand()
-
-#begins the game by initializing the Game object
-game = Game()
+#begins the game by initializing the Game object, only when run as a script
+#so the engine can be imported without starting a console game
+if __name__ == '__main__':
+    game = Game()
@@ -0,0 +1,2304 @@
+'''
+Scrapes through a given URL and produces a text representation of the page
+and saves as a local text file
+
+Usage:
+python text_scraper.py http://www.example.com/ --max 10 --workers 4
+
+or from Python, without crawling on import:
+from text_scraper import Crawler
+crawler = Crawler('http://www.example.com/', 10, workers=4)
+crawler.run()
+
+To crawl many sites at once, sharded across processes:
+python text_scraper.py --seeds sites.txt --processes 8 --max 100
+
+Run with --help for every option: concurrency, parser backend, output
+format/compression/sharding, timeouts, incremental recrawl state,
+checkpoint/--resume, parser processes, duplicate skipping, metrics and
+sitemap seeding/priority scheduling.
+requests, bs4 and the asyncio machinery are only imported once a crawl needs
+them, so importing this file and --help stay cheap
+
+TODO
+- test if a page doesn't have a header
+- break if file is not writable
+
+NOTES:
+I am a polite crawler that will crawl at a rate of 1 second per page, or at
+the Crawl-delay/Request-rate a site's robots.txt asks for. I also
+respects robots.txt, read once per host and cached for an hour
+With more than one worker, pages are fetched concurrently but each host is
+still only hit once per second; output is written in the same order pages
+are taken off the queue
+Does not assume www.example.com is the same as example.com
+Does not crawl images, binary documents or hashtag links, and gives up on
+pages over --max-body bytes or that turn out to be binary part way
+'''
+import re
+import time
+import os
+import threading
+import hashlib
+import math
+import heapq
+import bisect
+import datetime
+import xml.etree.ElementTree as ElementTree
+import json
+import gzip
+import zlib
+import codecs
+import sqlite3
+import pickle
+import argparse
+from contextlib import contextmanager
+from collections import deque
+from urllib.parse import urlparse
+from urllib.parse import urljoin
+from urllib.parse import urldefrag
+from urllib.parse import urlunparse
+from html.parser import HTMLParser
+
+def host_key(url):
+    '''
+    Returns scheme://host for url, lowercased, used to key per-host state
+    '''
+    parsed = urlparse(url)
+    return parsed.scheme.lower() + '://' + parsed.netloc.lower()
+
+class SessionPool(object):
+    '''
+    Hands out one keep-alive requests.Session per host so connections and
+    TLS handshakes are reused. Every request gets connect/read timeouts and
+    exponential-backoff retries that honor Retry-After. After max_failures
+    failed requests in a row a host is left alone for cooldown seconds
+    '''
+
+    def __init__(self, pool_size=10, timeout=(5, 30), retries=3, backoff=0.5,
+                 max_failures=5, cooldown=300):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.sessions = {}
+        self.failures = {}
+        self.opened_at = {}
+        self.lock = threading.Lock()
+
+    def session(self, url):
+        '''
+        Returns the Session for the host of url, creating it if needed
+        '''
+        key = host_key(url)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None:
+                session = self._new_session()
+                self.sessions[key] = session
+        return session
+
+    def get(self, url, **kwargs):
+        '''
+        GETs url on its host's session, recording the outcome for the breaker
+        '''
+        import requests
+
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            page = self.session(url).get(url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.record_failure(url)
+            raise
+
+        if page.status_code >= 500:
+            self.record_failure(url)
+        else:
+            self.record_success(url)
+        return page
+
+    def available(self, url):
+        '''
+        Returns False while the host's circuit breaker is open. Once the
+        cooldown has passed a single request is let through to test it:
+        the breaker closes if it succeeds and stays open for another
+        cooldown if it fails
+        '''
+        key = host_key(url)
+        with self.lock:
+            if self.failures.get(key, 0) < self.max_failures:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at[key] < self.cooldown:
+                return False
+            #re-arm the breaker so nothing else gets through with the probe
+            self.opened_at[key] = now
+            return True
+
+    def retry_at(self, url):
+        '''
+        Returns the time.monotonic() at which the host may be tried again,
+        0 if its breaker is closed
+        '''
+        key = host_key(url)
+        with self.lock:
+            if self.failures.get(key, 0) < self.max_failures:
+                return 0
+            return self.opened_at[key] + self.cooldown
+
+    def record_failure(self, url):
+        key = host_key(url)
+        with self.lock:
+            self.failures[key] = self.failures.get(key, 0) + 1
+            if self.failures[key] >= self.max_failures:
+                self.opened_at[key] = time.monotonic()
+
+    def record_success(self, url):
+        key = host_key(url)
+        with self.lock:
+            self.failures.pop(key, None)
+            self.opened_at.pop(key, None)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+    def _new_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(total=self.retries, backoff_factor=self.backoff,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET', 'HEAD']),
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+class RobotsCache(object):
+    '''
+    Keeps one parsed robots.txt per scheme and host, shared by every fetch.
+    Entries older than ttl seconds are evicted and fetched again
+    '''
+
+    def __init__(self, ttl=3600, user_agent='*', sessions=None):
+        self.ttl = ttl
+        self.user_agent = user_agent
+        self.sessions = sessions if sessions is not None else SessionPool()
+        self.entries = {}
+        self.host_locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        '''
+        Returns the RobotFileParser for the host of url, reading it if needed
+        '''
+        key = host_key(url)
+
+        #one lock per host so a slow robots.txt does not block other hosts
+        with self.lock:
+            host_lock = self.host_locks.setdefault(key, threading.Lock())
+
+        with host_lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                entry = (time.monotonic(), self._read(key))
+                with self.lock:
+                    self._evict_expired()
+                    self.entries[key] = entry
+
+        return entry[1]
+
+    def can_fetch(self, url):
+        return self.get(url).can_fetch(self.user_agent, url)
+
+    def delay(self, url, default):
+        '''
+        Returns the seconds to wait between requests to the host of url,
+        from Crawl-delay or Request-rate, or default if robots.txt sets neither
+        '''
+        rp = self.get(url)
+
+        crawl_delay = rp.crawl_delay(self.user_agent)
+        if crawl_delay is not None:
+            return float(crawl_delay)
+
+        request_rate = rp.request_rate(self.user_agent)
+        if request_rate is not None and request_rate.requests:
+            return request_rate.seconds / request_rate.requests
+
+        return default
+
+    def _read(self, key):
+        #same rules as RobotFileParser.read, but over the pooled session so
+        #robots.txt gets timeouts and retries too
+        import requests
+        from urllib import robotparser
+
+        rp = robotparser.RobotFileParser(key + '/robots.txt')
+        try:
+            page = self.sessions.get(rp.url)
+        except requests.exceptions.RequestException:
+            #an unread parser disallows everything, which is what we want
+            #for a host that is not answering
+            print('Could not read %s' %rp.url)
+            return rp
+
+        if page.status_code in (401, 403):
+            rp.disallow_all = True
+        elif 400 <= page.status_code < 500:
+            rp.allow_all = True
+        elif page.status_code < 400:
+            rp.parse(page.text.splitlines())
+        else:
+            print('Could not read %s' %rp.url)
+            return rp
+
+        rp.modified()
+        return rp
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [k for k, entry in self.entries.items() if now - entry[0] > self.ttl]:
+            del self.entries[key]
+
+
+class PageTokenizer(HTMLParser):
+    '''
+    Streaming parser that skips building a tree and only collects what the
+    crawler needs: link hrefs, the first heading and the visible text
+    '''
+    heading_tags = ['h1', 'h2', 'h3', 'h4', 'h5']
+
+    def __init__(self, filter_tags):
+        super().__init__()
+        self.filter_tags = filter_tags
+        self.links = []
+        self.texts = []
+        self.heading = None
+        self.heading_texts = []
+        self.skip_depth = 0
+        self.heading_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href is not None:
+                self.links.append(href)
+
+        if tag in self.filter_tags:
+            self.skip_depth += 1
+        elif tag in self.heading_tags and self.heading is None and not self.skip_depth:
+            self.heading_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.filter_tags and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in self.heading_tags and self.heading_depth:
+            self.heading_depth -= 1
+            if not self.heading_depth:
+                self.heading = ''.join(self.heading_texts)
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        self.texts.append(data)
+        if self.heading_depth:
+            self.heading_texts.append(data)
+
+    def get_text(self):
+        return ''.join(self.texts)
+
+class BloomFilter(object):
+    '''
+    Fixed-size probabilistic set for very large crawls. Never forgets an item,
+    but may claim to have seen one it has not (about error_rate of the time)
+    '''
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2) + 1
+        self.hashes = int(round(self.size / capacity * math.log(2))) or 1
+        self.bits = bytearray(self.size // 8 + 1)
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        for position in self._positions(item):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def get_state(self):
+        return {'size': self.size, 'hashes': self.hashes, 'bits': bytes(self.bits)}
+
+    @classmethod
+    def from_state(cls, state):
+        bloom = cls.__new__(cls)
+        bloom.size = state['size']
+        bloom.hashes = state['hashes']
+        bloom.bits = bytearray(state['bits'])
+        return bloom
+
+    def _positions(self, item):
+        #double hashing, k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+class DuplicateIndex(object):
+    '''
+    Remembers the text of every page crawled and flags exact duplicates
+    (same hash) and near duplicates (64-bit SimHash of word 3-shingles at
+    most max_distance bits apart). Near matches are found through an LSH
+    index of max_distance + 1 bands, any close fingerprint shares at least
+    one band with the new one. If log is set, every page added is reported
+    to it (see CrawlCheckpoint)
+    '''
+    bits = 64
+    min_shingles = 8
+    #bit_tables[bit] maps every byte value to its bit'th bit
+    bit_tables = [bytes(byte >> bit & 1 for byte in range(256)) for bit in range(8)]
+
+    def __init__(self, max_distance=3, log=None):
+        self.max_distance = max_distance
+        self.band_count = max_distance + 1
+        self.band_width = self.bits // self.band_count
+        self.exact = {}
+        self.bands = [{} for i in range(self.band_count)]
+        self.log = log
+
+    @staticmethod
+    def fingerprint(text):
+        '''
+        Returns (exact hash, simhash or None) for text. Pages too short to
+        shingle meaningfully only get the exact hash
+        '''
+        words = re.findall(r'\w+', text.lower())
+        exact = hashlib.sha1(' '.join(words).encode('utf-8')).hexdigest()
+
+        shingles = set(' '.join(words[i:i + 3]) for i in range(len(words) - 2))
+        if len(shingles) < DuplicateIndex.min_shingles:
+            return (exact, None)
+
+        digests = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+
+        #count each bit position over all the hashes at once, a column of
+        #bytes at a time, instead of bit by bit per shingle
+        half = len(shingles) / 2
+        simhash = 0
+        for position in range(DuplicateIndex.bits // 8):
+            column = digests[position::8]
+            for bit, table in enumerate(DuplicateIndex.bit_tables):
+                if column.translate(table).count(1) > half:
+                    simhash |= 1 << (8 * position + bit)
+        return (exact, simhash)
+
+    def check(self, fingerprint, url):
+        '''
+        Returns the url of the page this one duplicates, or None after
+        adding it to the index
+        '''
+        exact, simhash = fingerprint
+
+        if exact in self.exact:
+            return self.exact[exact]
+
+        if simhash is not None:
+            for band, key in enumerate(self._band_keys(simhash)):
+                for other, other_url in self.bands[band].get(key, ()):
+                    if bin(simhash ^ other).count('1') <= self.max_distance:
+                        return other_url
+
+        self.replay_add(fingerprint, url)
+        if self.log is not None:
+            self.log.indexed(fingerprint, url)
+        return None
+
+    def replay_add(self, fingerprint, url):
+        '''
+        Adds a page to the index without logging it
+        '''
+        exact, simhash = fingerprint
+        if simhash is not None:
+            for band, key in enumerate(self._band_keys(simhash)):
+                self.bands[band].setdefault(key, []).append((simhash, url))
+        self.exact[exact] = url
+
+    def get_state(self):
+        return {'exact': self.exact, 'bands': self.bands}
+
+    def set_state(self, state):
+        self.exact = dict(state['exact'])
+        self.bands = [dict(band) for band in state['bands']]
+
+    def _band_keys(self, simhash):
+        mask = (1 << self.band_width) - 1
+        return [simhash >> (band * self.band_width) & mask for band in range(self.band_count)]
+
+class Frontier(object):
+    '''
+    Queue of canonical URLs still to crawl, plus a seen-set of every URL
+    ever queued so nothing is queued twice. FIFO by default; with prioritize
+    it is a heap and the URL with the highest score is crawled first. Pass
+    bloom_capacity to keep the seen-set in a BloomFilter for multi-million
+    URL crawls. If log is set, every add and pop is reported to it (see
+    CrawlCheckpoint). Heap entries carry the link depth the score was
+    computed from, so pages found on a popped page can be scored from it
+    '''
+
+    def __init__(self, bloom_capacity=None, log=None, prioritize=False):
+        self.prioritize = prioritize
+        self.queue = [] if prioritize else deque()
+        self.log = log
+        #heap entries popped while replaying a checkpoint, skipped on pop
+        self.removed = set()
+        self.counter = 0
+        if bloom_capacity:
+            self.seen = BloomFilter(bloom_capacity)
+        else:
+            self.seen = set()
+
+    def add(self, url, score=0, depth=0):
+        '''
+        Queues url unless it has been seen before, returns True if queued
+        '''
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self._push(url, score, depth)
+        if self.log is not None:
+            self.log.discovered(url, score, depth)
+        return True
+
+    def pop(self):
+        '''
+        Returns (url, depth) of the next URL to crawl. The FIFO queue does
+        not score links, so its depth is always 0
+        '''
+        if self.prioritize:
+            entry = heapq.heappop(self.queue)
+            while entry[2] in self.removed:
+                self.removed.discard(entry[2])
+                entry = heapq.heappop(self.queue)
+            url, depth = entry[2], entry[3]
+        else:
+            url, depth = self.queue.popleft(), 0
+        if self.log is not None:
+            self.log.popped(url, depth)
+        return url, depth
+
+    def replay_add(self, url, score=0, depth=0):
+        '''
+        Re-applies a logged add without logging it again
+        '''
+        self.seen.add(url)
+        self._push(url, score, depth)
+
+    def replay_pop(self, url):
+        '''
+        Re-applies a logged pop of url without logging it again
+        '''
+        if self.prioritize:
+            self.removed.add(url)
+        else:
+            self.queue.popleft()
+
+    def requeue_first(self, entries):
+        '''
+        Puts the (url, depth) entries back at the front of the queue, in order
+        '''
+        if self.prioritize:
+            #drop the entries replay_pop marked, or they would shadow these
+            self.queue = [entry for entry in self.queue if entry[2] not in self.removed]
+            heapq.heapify(self.queue)
+            self.removed = set()
+            for url, depth in entries:
+                self._push(url, float('inf'), depth)
+        else:
+            self.queue.extendleft(reversed([url for url, depth in entries]))
+
+    def get_state(self):
+        if isinstance(self.seen, BloomFilter):
+            seen = self.seen.get_state()
+        else:
+            seen = self.seen
+        return {'queue': list(self.queue), 'seen': seen, 'removed': self.removed, 'counter': self.counter}
+
+    def set_state(self, state):
+        if self.prioritize:
+            self.queue = list(state['queue'])
+            heapq.heapify(self.queue)
+        else:
+            self.queue = deque(state['queue'])
+        self.removed = set(state.get('removed', ()))
+        self.counter = state.get('counter', 0)
+        if isinstance(state['seen'], dict):
+            self.seen = BloomFilter.from_state(state['seen'])
+        else:
+            self.seen = set(state['seen'])
+
+    def _push(self, url, score, depth=0):
+        if self.prioritize:
+            #counter keeps equal scores in FIFO order
+            heapq.heappush(self.queue, (-score, self.counter, url, depth))
+            self.counter += 1
+        else:
+            self.queue.append(url)
+
+    def __len__(self):
+        return len(self.queue) - len(self.removed)
+
+class CrawlCheckpoint(object):
+    '''
+    Lets a crawl that died continue where it stopped. Frontier adds and pops,
+    pages added to the duplicate index and finished pages go to an
+    append-only log; every `every` finished pages a commit marker with the
+    page count and output offsets is flushed to it, and every snapshot_every
+    markers the whole frontier and duplicate index are written as a
+    snapshot and a fresh log is started. Resuming loads the snapshot and
+    replays the log up to its last marker, so anything after it is redone
+    '''
+
+    def __init__(self, directory, every=100, snapshot_every=50):
+        self.directory = directory
+        self.every = every
+        self.snapshot_every = snapshot_every
+        self.generation = 0
+        self.marks = 0
+        self.in_flight = {}
+        self.log_file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def discovered(self, url, score=0, depth=0):
+        self._log(['d', url, score, depth])
+
+    def popped(self, url, depth=0):
+        self.in_flight[url] = depth
+        self._log(['p', url, depth])
+
+    def indexed(self, fingerprint, url):
+        self._log(['x', fingerprint[0], fingerprint[1], url])
+
+    def done(self, url):
+        '''
+        Records that url is finished and its output, if any, was written
+        '''
+        self.in_flight.pop(url, None)
+        self._log(['f', url])
+
+    def mark(self, count, offsets, frontier, duplicates=None):
+        '''
+        Commits everything logged so far, snapshotting now and then
+        '''
+        self._log(['c', count, offsets])
+        self.log_file.flush()
+        os.fsync(self.log_file.fileno())
+
+        self.marks += 1
+        if self.marks % self.snapshot_every == 0:
+            self._snapshot(count, offsets, frontier, duplicates)
+
+    def load(self, frontier, duplicates=None):
+        '''
+        Restores frontier and the duplicate index, if any, to the last marker
+        and returns (count, offsets), or None if there is nothing to resume
+        '''
+        snapshot_path = os.path.join(self.directory, 'snapshot.pickle')
+        count, offsets, in_flight = 0, None, {}
+        found = False
+
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as file:
+                snapshot = pickle.load(file)
+            self.generation = snapshot['generation']
+            frontier.set_state(snapshot['frontier'])
+            if duplicates is not None and snapshot.get('duplicates') is not None:
+                duplicates.set_state(snapshot['duplicates'])
+            count, offsets, in_flight = snapshot['count'], snapshot['offsets'], snapshot['in_flight']
+            found = True
+
+        log_path = self._log_path()
+        if os.path.exists(log_path):
+            with open(log_path) as file:
+                events = []
+                for line in file:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        #torn last line from the crash
+                        break
+
+            #only replay up to the last commit marker
+            last_mark = max([i for i, event in enumerate(events) if event[0] == 'c'] or [-1])
+            in_flight = dict(in_flight)
+            for event in events[:last_mark + 1]:
+                if event[0] == 'd':
+                    frontier.replay_add(event[1], event[2], event[3])
+                elif event[0] == 'p':
+                    frontier.replay_pop(event[1])
+                    in_flight[event[1]] = event[2]
+                elif event[0] == 'f':
+                    in_flight.pop(event[1], None)
+                elif event[0] == 'x':
+                    if duplicates is not None:
+                        duplicates.replay_add((event[1], event[2]), event[3])
+                else:
+                    count, offsets = event[1], event[2]
+                    found = True
+
+        if not found:
+            return None
+
+        #pages that were in flight at the marker are crawled again first
+        frontier.requeue_first(list(in_flight.items()))
+
+        #rewrite the recovered state as a fresh generation
+        self._snapshot(count, offsets, frontier, duplicates)
+        return (count, offsets)
+
+    def close(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+    def reset(self):
+        '''
+        Throws away any earlier checkpoint for a crawl starting from scratch
+        '''
+        self.close()
+        for name in os.listdir(self.directory):
+            if name.startswith('log-') or name.startswith('snapshot.pickle'):
+                os.remove(os.path.join(self.directory, name))
+        self.generation = 0
+        self.marks = 0
+        self.in_flight = {}
+
+    def _snapshot(self, count, offsets, frontier, duplicates=None):
+        snapshot = {
+            'generation': self.generation + 1,
+            'count': count,
+            'offsets': offsets,
+            'frontier': frontier.get_state(),
+            'duplicates': duplicates.get_state() if duplicates is not None else None,
+            'in_flight': dict(self.in_flight) if frontier.log is self else {},
+        }
+        path = os.path.join(self.directory, 'snapshot.pickle')
+        with open(path + '.tmp', 'wb') as file:
+            pickle.dump(snapshot, file, pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+
+        #the snapshot covers the old log, start the next generation's log
+        old_log = self._log_path()
+        self.close()
+        self.generation += 1
+        self.in_flight = dict(snapshot['in_flight'])
+        if os.path.exists(old_log):
+            os.remove(old_log)
+
+    def _log(self, event):
+        if self.log_file is None:
+            self.log_file = open(self._log_path(), 'a', buffering=1 << 16)
+        self.log_file.write(json.dumps(event) + '\n')
+
+    def _log_path(self):
+        return os.path.join(self.directory, 'log-%d.jsonl' %self.generation)
+
+class PageStateStore(object):
+    '''
+    SQLite record of every page crawled, keyed by canonical URL: ETag,
+    Last-Modified, content hash, the links found on it and when it was last
+    crawled. Lets a recrawl send conditional GETs and skip unchanged pages
+    '''
+
+    def __init__(self, path, commit_every=100):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, '
+            'content_hash TEXT, links TEXT, crawled_at REAL)')
+        self.commit_every = commit_every
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        '''
+        Returns the stored row for url as a dict, or None
+        '''
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT etag, last_modified, content_hash, links, crawled_at FROM pages WHERE url = ?',
+                (url,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'content_hash': row[2],
+            'links': json.loads(row[3]),
+            'crawled_at': row[4],
+        }
+
+    def conditional_headers(self, url):
+        '''
+        Returns If-None-Match/If-Modified-Since headers for a recrawl of url
+        '''
+        headers = {}
+        stored = self.get(url)
+        if stored is not None:
+            if stored['etag']:
+                headers['If-None-Match'] = stored['etag']
+            if stored['last_modified']:
+                headers['If-Modified-Since'] = stored['last_modified']
+        return headers
+
+    def save(self, url, page, content_hash, links):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)',
+                (url, page.headers.get('ETag'), page.headers.get('Last-Modified'),
+                 content_hash, json.dumps(links), time.time()))
+            self._maybe_commit()
+
+    def touch(self, url):
+        '''
+        Marks url as crawled now without changing anything else
+        '''
+        with self.lock:
+            self.connection.execute('UPDATE pages SET crawled_at = ? WHERE url = ?', (time.time(), url))
+            self._maybe_commit()
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def _maybe_commit(self):
+        #batch commits, a commit per page would dominate a fast crawl
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.connection.commit()
+            self.pending = 0
+
+class OutputSink(object):
+    '''
+    Keeps one buffered output file open for the whole crawl and writes each
+    page as a single document, either in the text banner format or as JSON
+    lines. Output can be gzip or zstd compressed, and with max_bytes set it
+    rolls over to numbered shards (name-00000.jsonl.gz, name-00001...)
+    once a shard has that many uncompressed bytes
+    '''
+    extensions = {'text': '.txt', 'jsonl': '.jsonl'}
+    compressions = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, name, format='text', compression=None, max_bytes=None, buffer_size=1 << 20):
+        if format not in self.extensions:
+            raise ValueError('Unknown output format %s' %format)
+        if compression not in self.compressions:
+            raise ValueError('Unknown output compression %s' %compression)
+
+        self.name = name
+        self.format = format
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        self.shard = 0
+        self.shard_bytes = 0
+        self.file = None
+
+    def path(self):
+        '''
+        Returns the path of the file currently being written
+        '''
+        suffix = self.extensions[self.format] + self.compressions[self.compression]
+        if self.max_bytes:
+            return '%s-%05d%s' %(self.name, self.shard, suffix)
+        return self.name + suffix
+
+    def write_headers(self, headers):
+        #site headers only have a place in the text format
+        if self.format == 'text':
+            self._write('\n\n================= Site Headers =================\n\n\n\n%s\n' %str(headers))
+
+    def write_page(self, record, pagename):
+        '''
+        Writes one page. record has url, status, heading, text and fetch_time
+        '''
+        if self.format == 'jsonl':
+            document = json.dumps(record, ensure_ascii=False) + '\n'
+        else:
+            document = '\n\n================= %s =================\n\n\n%s\n%s\n' %(pagename, record['heading'], record['text'])
+        self._write(document)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def checkpoint(self):
+        '''
+        Closes the current file so everything written is complete on disk,
+        even inside a compressed stream, and returns the offsets to restore.
+        The next write reopens the same shard in append mode
+        '''
+        self.close()
+        size = 0
+        if os.path.exists(self.path()):
+            size = os.path.getsize(self.path())
+        return [self.shard, self.shard_bytes, size]
+
+    def restore(self, offsets):
+        '''
+        Cuts the output back to a checkpoint, dropping anything written after it
+        '''
+        self.close()
+        self.shard, self.shard_bytes, size = offsets
+
+        if os.path.exists(self.path()):
+            with open(self.path(), 'r+b') as file:
+                file.truncate(size)
+
+        #shards started after the checkpoint
+        shard = self.shard + 1
+        while self.max_bytes and os.path.exists('%s-%05d%s' %(self.name, shard, self.extensions[self.format] + self.compressions[self.compression])):
+            os.remove('%s-%05d%s' %(self.name, shard, self.extensions[self.format] + self.compressions[self.compression]))
+            shard += 1
+
+    def _write(self, document):
+        data = document.encode('utf-8')
+
+        if self.file is not None and self.max_bytes and self.shard_bytes + len(data) > self.max_bytes and self.shard_bytes:
+            self.close()
+            self.shard += 1
+            self.shard_bytes = 0
+
+        if self.file is None:
+            self.file = self._open(self.path())
+
+        self.file.write(data)
+        self.shard_bytes += len(data)
+
+    def _open(self, path):
+        raw = open(path, 'ab', buffering=self.buffer_size)
+        if self.compression == 'gzip':
+            return gzip.GzipFile(fileobj=raw, mode='ab', filename='')
+        if self.compression == 'zstd':
+            import zstandard
+            return zstandard.ZstdCompressor().stream_writer(raw)
+        return raw
+
+class CrawlMetrics(object):
+    '''
+    Thread-safe crawl instrumentation: time spent per stage (connect,
+    download, robots, parse, links, write), event counters (bytes, status
+    codes, skipped formats, duplicates...), the frontier depth and a latency
+    histogram per host. Reported as a stats line, a JSON dump or a
+    Prometheus text file
+    '''
+    latency_buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.stages = {}
+        self.counters = {}
+        self.statuses = {}
+        self.hosts = {}
+        self.queue_depth = 0
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.time(stage, time.perf_counter() - start)
+
+    def time(self, stage, seconds):
+        with self.lock:
+            stage_stats = self.stages.setdefault(stage, [0, 0.0, 0.0])
+            stage_stats[0] += 1
+            stage_stats[1] += seconds
+            if seconds > stage_stats[2]:
+                stage_stats[2] = seconds
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def status(self, code):
+        with self.lock:
+            self.statuses[code] = self.statuses.get(code, 0) + 1
+
+    def latency(self, url, seconds):
+        '''
+        Adds a response time to the host's histogram
+        '''
+        host = host_key(url)
+        with self.lock:
+            histogram = self.hosts.get(host)
+            if histogram is None:
+                #one count per bucket plus +Inf, then count and sum
+                histogram = self.hosts[host] = [0] * (len(self.latency_buckets) + 1) + [0, 0.0]
+            for i, bound in enumerate(self.latency_buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(self.latency_buckets)] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    def summary(self):
+        '''
+        Returns everything collected as a JSON-friendly dict
+        '''
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            buckets = [str(bound) for bound in self.latency_buckets] + ['+Inf']
+            return {
+                'elapsed': elapsed,
+                'pages': self.counters.get('pages', 0),
+                'pages_per_second': self.counters.get('pages', 0) / elapsed if elapsed else 0,
+                'queue_depth': self.queue_depth,
+                'counters': dict(self.counters),
+                'statuses': dict((str(code), count) for code, count in self.statuses.items()),
+                'stages': dict((stage, {'count': count, 'seconds': total, 'max': longest})
+                               for stage, (count, total, longest) in self.stages.items()),
+                'hosts': dict((host, {'buckets': dict(zip(buckets, histogram[:-2])),
+                                      'count': histogram[-2], 'seconds': histogram[-1]})
+                              for host, histogram in self.hosts.items()),
+            }
+
+    def stats_line(self):
+        summary = self.summary()
+        stages = ' '.join('%s %.1fms' %(stage, stats['seconds'] / stats['count'] * 1000)
+                          for stage, stats in sorted(summary['stages'].items()) if stats['count'])
+        statuses = ' '.join('%s:%d' %item for item in sorted(summary['statuses'].items()))
+        return '[stats] %d pages (%.1f/s), %.1f MB, queue %d, status %s, avg %s' %(
+            summary['pages'], summary['pages_per_second'],
+            summary['counters'].get('bytes', 0) / 1e6, summary['queue_depth'],
+            statuses or '-', stages or '-')
+
+    def dump_json(self, path):
+        self._write_atomic(path, json.dumps(self.summary(), indent=2, sort_keys=True) + '\n')
+
+    def write_prometheus(self, path):
+        '''
+        Writes the metrics in the Prometheus text format, e.g. for the
+        node_exporter textfile collector
+        '''
+        summary = self.summary()
+        lines = [
+            '# TYPE crawler_stage_seconds summary',
+        ]
+        for stage, stats in sorted(summary['stages'].items()):
+            lines.append('crawler_stage_seconds_sum{stage="%s"} %f' %(stage, stats['seconds']))
+            lines.append('crawler_stage_seconds_count{stage="%s"} %d' %(stage, stats['count']))
+        lines.append('# TYPE crawler_events_total counter')
+        for name, count in sorted(summary['counters'].items()):
+            lines.append('crawler_events_total{event="%s"} %d' %(name, count))
+        lines.append('# TYPE crawler_responses_total counter')
+        for code, count in sorted(summary['statuses'].items()):
+            lines.append('crawler_responses_total{status="%s"} %d' %(code, count))
+        lines.append('# TYPE crawler_queue_depth gauge')
+        lines.append('crawler_queue_depth %d' %summary['queue_depth'])
+        lines.append('# TYPE crawler_host_latency_seconds histogram')
+        for host, histogram in sorted(summary['hosts'].items()):
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                lines.append('crawler_host_latency_seconds_bucket{host="%s",le="%s"} %d' %(host, bound, cumulative))
+            lines.append('crawler_host_latency_seconds_sum{host="%s"} %f' %(host, histogram['seconds']))
+            lines.append('crawler_host_latency_seconds_count{host="%s"} %d' %(host, histogram['count']))
+        self._write_atomic(path, '\n'.join(lines) + '\n')
+
+    def _write_atomic(self, path, text):
+        #scrapers and tailing jobs never see a half-written file
+        with open(path + '.tmp', 'w') as file:
+            file.write(text)
+        os.replace(path + '.tmp', path)
+
+class SitemapReader(object):
+    '''
+    Streams URLs out of sitemap.xml files, following sitemap indexes and
+    reading gzipped sitemaps on the fly. Elements are cleared as soon as
+    they are read, so huge sitemaps never sit in memory whole
+    '''
+
+    def __init__(self, sessions, max_depth=3):
+        self.sessions = sessions
+        self.max_depth = max_depth
+
+    def urls(self, sitemap_url, depth=0, seen=None):
+        '''
+        Yields (loc, lastmod, priority) for every URL in the sitemap, lastmod
+        as a date or None and priority as a float
+        '''
+        import requests
+
+        seen = set() if seen is None else seen
+        if sitemap_url in seen or depth > self.max_depth:
+            return
+        seen.add(sitemap_url)
+
+        try:
+            page = self.sessions.get(sitemap_url, stream=True)
+        except requests.exceptions.RequestException as e:
+            print('Could not fetch sitemap %s: %s' %(sitemap_url, e))
+            return
+        if page.status_code != 200:
+            page.close()
+            return
+
+        children = []
+        try:
+            for kind, fields in self._entries(page):
+                if kind == 'sitemap':
+                    #read nested sitemaps after this one is closed
+                    children.append(fields['loc'])
+                else:
+                    yield (fields['loc'], self._date(fields.get('lastmod')), self._priority(fields.get('priority')))
+        except ElementTree.ParseError as e:
+            print('Bad sitemap %s: %s' %(sitemap_url, e))
+        finally:
+            page.close()
+
+        for child in children:
+            for entry in self.urls(child, depth + 1, seen):
+                yield entry
+
+    def _entries(self, page):
+        parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        decompressor = None
+        root = None
+        level = 0
+        fields = {}
+        for index, chunk in enumerate(page.iter_content(1 << 16)):
+            #.xml.gz sitemaps are gzip files, not gzip content-encoding
+            if index == 0 and chunk[:2] == b'\x1f\x8b':
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+
+            for event, element in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = element
+                    level += 1
+                    continue
+
+                #only direct children of <url> count, extensions such as
+                #<image:image> nest a loc of their own
+                tag = element.tag.rsplit('}', 1)[-1]
+                if level == 3 and tag in ('loc', 'lastmod', 'priority'):
+                    fields[tag] = (element.text or '').strip()
+                elif level == 2 and tag in ('url', 'sitemap'):
+                    if fields.get('loc'):
+                        yield (tag, fields)
+                    fields = {}
+                    #drop everything parsed so far
+                    root.clear()
+                level -= 1
+        parser.close()
+
+    def _date(self, value):
+        try:
+            return datetime.date.fromisoformat(value[:10])
+        except (TypeError, ValueError):
+            return None
+
+    def _priority(self, value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.5
+
+class HostScheduler(object):
+    '''
+    Hands out fetch slots so that each host is hit at most once per delay,
+    while different hosts can be fetched at the same time. Sites that set a
+    Crawl-delay or Request-rate in robots.txt get their own delay. With
+    sessions set, a host whose circuit breaker is open is held until the
+    breaker lets a request through
+    '''
+
+    def __init__(self, delay=1, robots=None, sessions=None):
+        self.delay = delay
+        self.robots = robots
+        self.sessions = sessions
+        self.next_slot = {}
+
+    async def wait(self, url):
+        '''
+        Sleeps until the host of url may be fetched again and reserves the slot
+        '''
+        import asyncio
+
+        #www.host and host are one site, they share their slots
+        host = Crawler._normalize_url(urlparse(url).netloc.lower())
+        while True:
+            now = time.monotonic()
+            held = self.sessions.retry_at(url) if self.sessions is not None else 0
+            if held > now:
+                #checked every second, a probe may close the breaker early
+                await asyncio.sleep(min(held - now, 1))
+                continue
+
+            slot = max(now, self.next_slot.get(host, now))
+
+            delay = self.delay
+            if self.robots is not None:
+                delay = self.robots.delay(url, self.delay)
+            self.next_slot[host] = slot + delay
+
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            if self.sessions is None or self.sessions.available(url):
+                return
+
+class ResponseRejected(Exception):
+    '''
+    Raised while reading a body the crawler gives up on part way, reason is
+    the metrics counter for it
+    '''
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+class Crawler(object):
+    filter_tags = ['style', 'script', '[document]', 'head', 'title', 'nav', 'header', 'footer']
+    filter_formats = ['.txt', '.jpg', '.png', '.doc', '.docx', '.pdf', '.ppt', '.pptx', '.py', '.exe', '.dmg']
+    #magic numbers of formats that get served as text/html by mistake
+    binary_signatures = (b'%PDF', b'\x89PNG', b'GIF8', b'\xff\xd8\xff', b'PK\x03\x04', b'\x1f\x8b',
+                         b'\x7fELF', b'MZ', b'Rar!', b'7z\xbc\xaf')
+    chunk_size = 1 << 16
+
+    def __init__(self, url, max, workers=1, delay=1, robots=None, bloom_capacity=None, parser='html.parser',
+                 output='text', compression=None, shard_size=None, sessions=None,
+                 state=None, checkpoint=None, resume=False, parse_workers=0, parse_queue=None,
+                 dedupe=False, dedupe_distance=3, metrics=None, stats_interval=10,
+                 metrics_file=None, prometheus_file=None, prioritize=False, sitemaps=False, seeds=None,
+                 max_body=10 * 1024 * 1024):
+        #sitemap priorities and lastmods only matter with a priority frontier
+        self.prioritize = prioritize or sitemaps
+        self.sitemaps = sitemaps
+        self.frontier = Frontier(bloom_capacity, prioritize=self.prioritize)
+        self.url = url
+        #more seed URLs on the same site, crawled into the same output
+        self.seeds = list(seeds or [])
+        self.max = max
+        self.workers = workers
+        self.delay = delay
+        self.parser = parser
+        self.output = output
+        self.compression = compression
+        self.shard_size = shard_size
+        #bodies over this many bytes are abandoned, None or 0 for no limit
+        self.max_body = max_body
+        self.sink = None
+        self.seed_page = None
+        self.sessions = sessions if sessions is not None else SessionPool(workers)
+        self.robots = robots if robots is not None else RobotsCache(sessions=self.sessions)
+
+        if isinstance(state, str):
+            state = PageStateStore(state)
+        self.state = state
+
+        if isinstance(checkpoint, str):
+            checkpoint = CrawlCheckpoint(checkpoint)
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.parse_workers = parse_workers
+        self.parse_queue = parse_queue or parse_workers * 2
+        self.duplicates = DuplicateIndex(dedupe_distance) if dedupe else None
+        self.metrics = metrics if metrics is not None else CrawlMetrics()
+        self.stats_interval = stats_interval
+        self.metrics_file = metrics_file
+        self.prometheus_file = prometheus_file
+        self.last_stats = time.monotonic()
+        self.base_url = urlparse(url).scheme + '://' +  urlparse(url).netloc
+
+    def run(self):
+        '''
+        Crawls the URL and returns the number of pages crawled
+        '''
+        #parser processes only exist on the concurrent path, with one worker
+        #it still fetches a page at a time
+        if self.workers > 1 or self.parse_workers:
+            return self.crawl_async()
+        return self.crawl()
+
+    def crawl(self):
+        '''
+        Main function for crawling entire URL
+        '''
+        print('crawling: %s' %self.url)
+
+        #get filename from url, used for saving text to file system later
+        self.sink = self.open_sink(urlparse(self.url).netloc)
+        resumed_count = self.start_checkpoint()
+
+        for seed in [self.url] + self.seeds:
+            self.discover(seed, priority=1.0)
+        if self.sitemaps and resumed_count is None:
+            self.seed_sitemaps()
+
+        #while there are still items in the frontier
+        #or counter is less than max allowed
+
+        max_count = self.max
+        count = resumed_count or 0
+
+        try:
+            #print out some interesting info captured from the headers
+            if resumed_count is None:
+                self.process_headers()
+                self.save_checkpoint(count)
+
+            while self.frontier and count < max_count:
+                #parse items
+                next_link, depth = self.frontier.pop()
+                self.wait_for_host(next_link)
+                self.process(next_link, depth)
+
+                #sleep between requests, as long as the site asks for
+                time.sleep(self.robots.delay(self._normalize_relative_links(next_link), self.delay))
+                count += 1
+                self.page_done(next_link, count)
+        finally:
+            self.save_checkpoint(count)
+            if self.seed_page is not None:
+                #fetched for its headers but never processed
+                self.seed_page.close()
+                self.seed_page = None
+            self.sink.close()
+            if self.state is not None:
+                self.state.commit()
+            self.report_metrics(final=True)
+
+        print('Total pages crawled: %d' %count)
+        return count
+
+    def crawl_async(self):
+        '''
+        Crawls the URL with a pool of concurrent workers
+        '''
+        import asyncio
+        return asyncio.run(self._crawl_async())
+
+    async def _crawl_async(self):
+        print('crawling: %s' %self.url)
+
+        self.sink = self.open_sink(urlparse(self.url).netloc)
+        resumed_count = self.start_checkpoint()
+        for seed in [self.url] + self.seeds:
+            self.discover(seed, priority=1.0)
+
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures import ProcessPoolExecutor
+
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        scheduler = HostScheduler(self.delay, self.robots, self.sessions)
+
+        #parser processes, with a semaphore bounding how many downloaded
+        #bodies wait for them so fetchers back off when parsing falls behind
+        pipeline = None
+        if self.parse_workers:
+            pipeline = (ProcessPoolExecutor(self.parse_workers), asyncio.Semaphore(self.parse_queue))
+
+        #shared crawl state, safe without locks since only the event loop
+        #thread touches it
+        state = {'count': resumed_count or 0, 'in_flight': 0, 'written': resumed_count or 0, 'results': {}}
+        changed = asyncio.Condition()
+
+        async def worker():
+            while True:
+                async with changed:
+                    #wait for new links while other pages are still in flight
+                    while not self.frontier and state['in_flight'] and state['count'] < self.max:
+                        await changed.wait()
+
+                    if not self.frontier or state['count'] >= self.max:
+                        changed.notify_all()
+                        return
+
+                    next_link, depth = self.frontier.pop()
+                    seq = state['count']
+                    state['count'] += 1
+                    state['in_flight'] += 1
+
+                try:
+                    result = await self._process_async(next_link, loop, executor, scheduler, pipeline)
+                except BaseException:
+                    #the page never finished, a resumed crawl fetches it again
+                    state['in_flight'] -= 1
+                    raise
+
+                async with changed:
+                    state['in_flight'] -= 1
+                    state['results'][seq] = (next_link, depth, result)
+                    self._write_ready(state)
+                    changed.notify_all()
+
+        tasks = []
+        try:
+            if resumed_count is None:
+                await loop.run_in_executor(executor, self.process_headers)
+                if self.sitemaps:
+                    #no workers are running yet, so the frontier is ours
+                    await loop.run_in_executor(executor, self.seed_sitemaps)
+                self.save_checkpoint(state['written'])
+            tasks = [asyncio.ensure_future(worker()) for i in range(self.workers)]
+            await asyncio.gather(*tasks)
+        finally:
+            #if one worker failed, stop the others before saving anything
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            executor.shutdown(wait=True)
+            if pipeline is not None:
+                pipeline[0].shutdown(wait=True)
+            self.save_checkpoint(state['written'])
+            if self.seed_page is not None:
+                #fetched for its headers but never processed
+                self.seed_page.close()
+                self.seed_page = None
+            self.sink.close()
+            if self.state is not None:
+                self.state.commit()
+            self.report_metrics(final=True)
+
+        print('Total pages crawled: %d' %state['count'])
+        return state['count']
+
+    async def _process_async(self, url, loop, executor, scheduler, pipeline=None):
+        '''
+        Async counterpart of process. Returns (page, links, record,
+        fingerprint) for _write_ready to finish in queue order, so the
+        frontier grows and duplicates are kept as in a sequential crawl.
+        page is None for an unchanged page, the result None if there is
+        nothing to finish
+        '''
+        print("Next link to process is %s" %url)
+
+        url = self._normalize_relative_links(url)
+
+        #read robots.txt off the event loop so the scheduler only hits the cache
+        await loop.run_in_executor(executor, self.robots.get, url)
+        if self.sessions.retry_at(url) > time.monotonic():
+            print('Waiting for %s, host is not responding' %url)
+            self.metrics.count('host_unavailable')
+        await scheduler.wait(url)
+        page = await loop.run_in_executor(executor, self.fetch, url)
+
+        if page is None:
+            return None
+
+        import requests
+
+        try:
+            links = await loop.run_in_executor(executor, self.unchanged_links, page, url)
+            if links is not None:
+                print('Unchanged since last crawl: %s' %url)
+                self.metrics.count('unchanged')
+                await loop.run_in_executor(executor, self.release, page)
+                return (None, links, None, None)
+            elif not self.page_loaded(page):
+                await loop.run_in_executor(executor, self.release, page)
+            else:
+                #parse off the event loop, only discovery touches the frontier
+                if pipeline is None:
+                    links, parsed_text, heading, fingerprint = await loop.run_in_executor(
+                        executor, self.parse_page, page, url)
+                else:
+                    links, parsed_text, heading, fingerprint = await self._parse_in_pool(
+                        page, url, loop, executor, pipeline)
+
+                return (page, links, self.make_record(page, url, parsed_text, heading), fingerprint)
+        except ResponseRejected as e:
+            self.reject(page, url, e)
+        except requests.exceptions.RequestException as e:
+            #the read timeout fires while the body streams in, not in get
+            self.body_failed(page, url, e)
+
+    async def _parse_in_pool(self, page, url, loop, executor, pipeline):
+        '''
+        Downloads the body on a fetch thread and parses it in a parser process
+        '''
+        pool, slots = pipeline
+        async with slots:
+            content = await loop.run_in_executor(executor, self.read_body, page)
+            links, texts, heading, fingerprint, seconds = await loop.run_in_executor(
+                pool, Crawler.extract, content, self.charset(page, content), self.parser, self.duplicates is not None)
+
+        self.metrics.time('parse', seconds)
+        print('Parsed %s with %s in %.1f ms' %(url, self.parser, seconds * 1000))
+        return (links, texts, heading, fingerprint)
+
+    def _write_ready(self, state):
+        '''
+        Finishes pages in the order they were taken off the queue
+        '''
+        results = state['results']
+        while state['written'] in results:
+            url, depth, result = results.pop(state['written'])
+            state['written'] += 1
+            if result is not None:
+                page, links, record, fingerprint = result
+                page_url = self._normalize_relative_links(url)
+                if page is None:
+                    self.discover_links(links, page_url, depth)
+                else:
+                    self.keep_page(page, page_url, depth, links, record, fingerprint)
+            self.page_done(url, state['written'])
+
+    def wait_for_host(self, url):
+        '''
+        Sleeps while the circuit breaker of url's host is open, so a host
+        that stopped responding is paused rather than having its pages dropped
+        '''
+        if self.sessions.available(url):
+            return
+        print('Waiting for %s, host is not responding' %url)
+        self.metrics.count('host_unavailable')
+        while not self.sessions.available(url):
+            #checked every second, a probe may close the breaker early
+            time.sleep(min(max(self.sessions.retry_at(url) - time.monotonic(), 0.1), 1))
+
+    def start_checkpoint(self):
+        '''
+        Hooks the checkpoint log up to the frontier. When resuming, restores
+        the frontier and output from it and returns the page count to carry
+        on from, otherwise returns None
+        '''
+        if self.checkpoint is None:
+            return None
+
+        resumed = None
+        if self.resume:
+            resumed = self.checkpoint.load(self.frontier, self.duplicates)
+            if resumed is not None:
+                count, offsets = resumed
+                if offsets is not None:
+                    self.sink.restore(offsets)
+                print('Resuming after %d pages, %d left in the frontier' %(count, len(self.frontier)))
+                resumed = count
+            else:
+                print('No checkpoint to resume from, starting over')
+
+        if resumed is None:
+            self.checkpoint.reset()
+
+        self.frontier.log = self.checkpoint
+        if self.duplicates is not None:
+            self.duplicates.log = self.checkpoint
+        return resumed
+
+    def page_done(self, url, count):
+        '''
+        Logs a finished page, reports stats and checkpoints every so often.
+        count is None for pages that were skipped and do not count towards max
+        '''
+        if count is not None:
+            self.metrics.count('pages')
+        self.report_metrics()
+
+        if self.checkpoint is None:
+            return
+        self.checkpoint.done(url)
+        if count is not None and count % self.checkpoint.every == 0:
+            self.save_checkpoint(count)
+
+    def report_metrics(self, final=False):
+        '''
+        Prints the stats line and refreshes the Prometheus file every
+        stats_interval seconds, and writes the JSON dump at the end
+        '''
+        now = time.monotonic()
+        if not final and now - self.last_stats < self.stats_interval:
+            return
+        self.last_stats = now
+
+        self.metrics.queue_depth = len(self.frontier)
+        print(self.metrics.stats_line())
+        if self.prometheus_file:
+            self.metrics.write_prometheus(self.prometheus_file)
+        if final and self.metrics_file:
+            self.metrics.dump_json(self.metrics_file)
+
+    def save_checkpoint(self, count):
+        if self.checkpoint is None:
+            return
+        if self.state is not None:
+            self.state.commit()
+        self.checkpoint.mark(count, self.sink.checkpoint(), self.frontier, self.duplicates)
+
+    def open_sink(self, name):
+        '''
+        Opens the output sink the crawl writes every page to
+        '''
+        return OutputSink(name, self.output, self.compression, self.shard_size)
+
+    def process_headers(self):
+        '''
+        Fetches the seed and writes its headers. The response is kept so the
+        seed is not downloaded again when it is processed
+        '''
+        page = self.fetch(self.canonicalize(self.url))
+        if page is not None:
+            self.seed_page = page
+            self.sink.write_headers(page.headers)
+
+    def process(self, url, depth=0):
+        print("Next link to process is %s" %url)
+
+        url = self._normalize_relative_links(url)
+
+        page = self.fetch(url)
+        if page is None:
+            return
+
+        import requests
+
+        try:
+            links = self.unchanged_links(page, url)
+            if links is not None:
+                print('Unchanged since last crawl: %s' %url)
+                self.metrics.count('unchanged')
+                self.release(page)
+                self.discover_links(links, url, depth)
+            elif not self.page_loaded(page):
+                self.release(page)
+            else:
+                links, parsed_text, heading, fingerprint = self.parse_page(page, url)
+                self.keep_page(page, url, depth, links, self.make_record(page, url, parsed_text, heading), fingerprint)
+        except ResponseRejected as e:
+            self.reject(page, url, e)
+        except requests.exceptions.RequestException as e:
+            #the read timeout fires while the body streams in, not in get
+            self.body_failed(page, url, e)
+
+    def keep_page(self, page, url, depth, links, record, fingerprint=None):
+        '''
+        Queues the links of a parsed page and writes it, unless it duplicates
+        a page kept earlier
+        '''
+        if fingerprint is not None and self.is_duplicate(fingerprint, url):
+            self.remember_page(page, url, [])
+            return
+
+        self.discover_links(links, url, depth)
+        self.remember_page(page, url, links)
+        self.write_page_to_file(record)
+
+    def release(self, page):
+        '''
+        Closes a response whose body is not needed. A streamed connection
+        only goes back to the pool once its body has been read, closing it
+        early drops it, so short bodies like error pages are read first
+        '''
+        import requests
+
+        try:
+            read = 0
+            for chunk in page.iter_content(self.chunk_size):
+                read += len(chunk)
+                if read > self.chunk_size:
+                    break
+        except requests.exceptions.RequestException:
+            pass
+        page.close()
+
+    def body_failed(self, page, url, error):
+        '''
+        Drops a page whose body could not be read, counting it against the
+        host like a failed request
+        '''
+        print('Could not read %s: %s' %(url, error))
+        self.sessions.record_failure(url)
+        self.metrics.count('fetch_errors')
+        page.close()
+
+    def reject(self, page, url, error):
+        '''
+        Drops a page whose body was abandoned part way
+        '''
+        print('Skipping %s, %s' %(url, error))
+        self.metrics.count(error.reason)
+        page.close()
+
+    def is_duplicate(self, fingerprint, url):
+        '''
+        Checks the page against the duplicate index, duplicates are neither
+        written nor have their links followed
+        '''
+        original = self.duplicates.check(fingerprint, url)
+        if original is not None:
+            self.metrics.count('duplicates')
+            print('Skipping %s, duplicate of %s' %(url, original))
+            return True
+        return False
+
+    def unchanged_links(self, page, url):
+        '''
+        Returns the links stored for url if the page has not changed since the
+        last crawl (a 304, or the same content hash), otherwise None
+        '''
+        if self.state is None:
+            return None
+
+        stored = self.state.get(url)
+        if stored is None:
+            return None
+
+        if page.status_code == 304 or (self.page_loaded(page) and self.content_hash(page) == stored['content_hash']):
+            self.state.touch(url)
+            return stored['links']
+
+        return None
+
+    def remember_page(self, page, url, links):
+        if self.state is not None:
+            self.state.save(url, page, self.content_hash(page), links)
+
+    def content_hash(self, page):
+        #hashed while the body streams in
+        if getattr(page, 'body_hash', None) is None:
+            self.read_body(page)
+        return page.body_hash
+
+    def make_record(self, page, url, texts, heading):
+        '''
+        Returns the output record for a parsed page
+        '''
+        return {
+            'url': url,
+            'status': page.status_code,
+            'heading': heading,
+            'text': texts,
+            'fetch_time': page.elapsed.total_seconds(),
+        }
+
+    def fetch(self, url):
+        '''
+        Downloads url once and returns the response, or None if we may not
+        crawl it. The body is streamed, so non-html pages are rejected on
+        their headers before it is downloaded
+        '''
+        url = self._normalize_relative_links(url)
+
+        #the seed was already fetched for its headers, reuse that response
+        if self.seed_page is not None and url == self.canonicalize(self.url):
+            page = self.seed_page
+            self.seed_page = None
+            return page
+
+        with self.metrics.timer('robots'):
+            allowed = self.can_proceed(url)
+        if not allowed:
+            self.metrics.count('robots_disallowed')
+            return None
+
+        import requests
+
+        headers = {}
+        if self.state is not None:
+            headers = self.state.conditional_headers(url)
+
+        try:
+            page = self.sessions.get(url, stream=True, headers=headers)
+        except requests.exceptions.RequestException as e:
+            #link was badly formatted ex: //file instead of http://file,
+            #or the host did not answer in time after retries
+            print('Could not fetch %s: %s' %(url, e))
+            self.metrics.count('fetch_errors')
+            return None
+
+        #elapsed runs up to the response headers, so it covers DNS, connect
+        #and the server's time to first byte
+        self.metrics.time('connect', page.elapsed.total_seconds())
+        self.metrics.latency(url, page.elapsed.total_seconds())
+        self.metrics.status(page.status_code)
+
+        if page.status_code != 304 and not self.is_html(page):
+            #only grab html and text-based pages, a 304 has no body to check
+            self.metrics.count('skipped_content_type')
+            page.close()
+            return None
+
+        length = page.headers.get('Content-Length', '')
+        if self.max_body and length.isdigit() and int(length) > self.max_body:
+            print('Skipping %s, %s bytes is over the %d byte limit' %(url, length, self.max_body))
+            self.metrics.count('skipped_oversized')
+            page.close()
+            return None
+
+        return page
+
+    def read_body(self, page):
+        '''
+        Returns the body of a streamed response, timing the download the
+        first time it is read
+        '''
+        if getattr(page, 'body', None) is None:
+            with self.metrics.timer('download'):
+                page.body = b''.join(self.iter_body(page))
+        return page.body
+
+    def iter_body(self, page):
+        '''
+        Yields the body of a streamed response in chunks, hashing it on the
+        way. Raises ResponseRejected as soon as it goes over max_body or
+        turns out to be binary, without reading the rest
+        '''
+        digest = hashlib.sha1()
+        size = 0
+        for chunk in page.iter_content(self.chunk_size):
+            if not size and self.is_binary(page, chunk):
+                raise ResponseRejected('skipped_binary', 'body is not text')
+            size += len(chunk)
+            if self.max_body and size > self.max_body:
+                raise ResponseRejected('skipped_oversized', 'body is over the %d byte limit' %self.max_body)
+            digest.update(chunk)
+            self.metrics.count('bytes', len(chunk))
+            yield chunk
+        page.body_hash = digest.hexdigest()
+
+    def is_binary(self, page, head):
+        '''
+        Returns True if the first bytes of a body show it is not really text
+        '''
+        if head.startswith(self.binary_signatures):
+            return True
+        #only utf-16/32 text has NUL bytes
+        return b'\x00' in head[:1024] and not self.charset(page, head).startswith(('utf-16', 'utf-32'))
+
+    def charset(self, page, head=b''):
+        '''
+        Returns the encoding of a body: the Content-Type charset, else a byte
+        order mark or <meta> charset in its first bytes, else utf-8
+        '''
+        if getattr(page, 'charset', None) is not None:
+            return page.charset
+
+        candidates = [Crawler.declared_charset(page.headers.get('Content-Type', ''))]
+        for bom, encoding in [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'),
+                              (codecs.BOM_UTF16_BE, 'utf-16')]:
+            if head.startswith(bom):
+                candidates.append(encoding)
+        meta = re.search(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', head[:1024], re.IGNORECASE)
+        if meta:
+            candidates.append(meta.group(1).decode('ascii'))
+
+        page.charset = 'utf-8'
+        for encoding in candidates:
+            try:
+                page.charset = codecs.lookup(encoding).name
+                break
+            except (LookupError, TypeError):
+                continue
+        return page.charset
+
+    @staticmethod
+    def declared_charset(content_type):
+        '''
+        Returns the charset parameter of a Content-Type header, or None
+        '''
+        for param in content_type.split(';')[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'charset' and value.strip():
+                return value.strip().strip('"\'')
+        return None
+
+    def is_html(self, page):
+        '''
+        Returns True if the response headers say the body is html
+        '''
+        return 'text/html' in page.headers.get('Content-Type', '')
+
+    def can_proceed(self, url):
+        #makes sure we are allowed to crawl the url
+        #returns True or False depending on whether we can proceed
+
+        url = self._normalize_relative_links(url)
+
+        #check the shared robots cache to see if we can fetch a given URL
+        allowed_to_fetch = self.robots.can_fetch(url)
+
+        #thumbs up
+        if allowed_to_fetch:
+            return True
+        else:
+            return False
+
+    def page_loaded(self, request):
+        if request.status_code == 200:
+            return True
+
+    def parse_page(self, page, url):
+        '''
+        Parses a page once with the selected backend and reports how long it
+        took. Returns (links, texts, heading, fingerprint), the fingerprint
+        None unless duplicates are skipped
+        '''
+        dedupe = self.duplicates is not None
+        if self.parser == 'stream' and getattr(page, 'body', None) is None:
+            #nothing needed the whole body yet, so tokenize it as it arrives
+            links, texts, heading, seconds = self.stream_page(page)
+            fingerprint = None
+            if dedupe:
+                start = time.perf_counter()
+                fingerprint = DuplicateIndex.fingerprint(texts)
+                seconds += time.perf_counter() - start
+        else:
+            content = self.read_body(page)
+            links, texts, heading, fingerprint, seconds = Crawler.extract(
+                content, self.charset(page, content), self.parser, dedupe)
+
+        self.metrics.time('parse', seconds)
+        print('Parsed %s with %s in %.1f ms' %(url, self.parser, seconds * 1000))
+
+        return (links, texts, heading, fingerprint)
+
+    def stream_page(self, page):
+        '''
+        Downloads and tokenizes a body chunk by chunk, so only the extracted
+        text is kept and never the whole page. Returns (links, texts,
+        heading, seconds), seconds being the time spent tokenizing
+        '''
+        tokenizer = PageTokenizer(Crawler.filter_tags)
+        decoder = None
+        seconds = 0
+        start = time.perf_counter()
+
+        for chunk in self.iter_body(page):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(self.charset(page, chunk))('replace')
+            parse_start = time.perf_counter()
+            tokenizer.feed(decoder.decode(chunk))
+            seconds += time.perf_counter() - parse_start
+
+        parse_start = time.perf_counter()
+        if decoder is not None:
+            tokenizer.feed(decoder.decode(b'', True))
+        tokenizer.close()
+        seconds += time.perf_counter() - parse_start
+
+        self.metrics.time('download', time.perf_counter() - start - seconds)
+        return (tokenizer.links, Crawler.clean_text(tokenizer.get_text()), tokenizer.heading or '', seconds)
+
+    @staticmethod
+    def extract(content, encoding, parser, dedupe=False):
+        '''
+        Parses an html body once and returns (links, texts, heading,
+        fingerprint, seconds), fingerprinting the text for the duplicate
+        index if dedupe is set. Only takes plain data so it can run in a
+        parser process
+        '''
+        start = time.perf_counter()
+
+        if parser == 'stream':
+            tokenizer = PageTokenizer(Crawler.filter_tags)
+            tokenizer.feed(content.decode(encoding or 'utf-8', 'replace'))
+            tokenizer.close()
+            links = tokenizer.links
+            texts = Crawler.clean_text(tokenizer.get_text())
+            heading = tokenizer.heading or ''
+        else:
+            #links first, parse rips filtered tags out of the soup
+            soup = Crawler.convert_to_soup(content, parser, encoding)
+            links = Crawler.get_links(soup)
+            texts, heading = Crawler.parse(soup)
+
+        fingerprint = DuplicateIndex.fingerprint(texts) if dedupe else None
+        return (links, texts, heading, fingerprint, time.perf_counter() - start)
+
+    @staticmethod
+    def parse(soup):
+        #kill all script and style elements
+        for script in soup(Crawler.filter_tags):
+            script.extract() #rip it out
+
+        #get text
+        texts = soup.get_text()
+
+        #get first headline you see
+        heading = soup.find(['h1', 'h2', 'h3', 'h4', 'h5'])
+        if heading:
+            heading = heading.get_text()
+        else:
+            heading = ''
+
+        return (Crawler.clean_text(texts), heading)
+
+    @staticmethod
+    def clean_text(texts):
+        #filter out tab and newlines
+        texts = texts.replace('\n', ' ')
+        texts = texts.replace('\t', ' ')
+        return texts
+
+    def write_page_to_file(self, record):
+        with self.metrics.timer('write'):
+            self.sink.write_page(record, urlparse(record['url']).path)
+
+    @staticmethod
+    def get_links(soup):
+        '''
+        Gets all links for a page
+        '''
+        return [a.get('href') for a in soup.find_all('a') if a.get('href') is not None]
+
+    def discover_links(self, links, url, depth=0):
+        '''
+        Queues the valid links found on the page at url, which was found
+        depth links away from the seed
+        '''
+        with self.metrics.timer('links'):
+            for link in links:
+                if self.is_valid_link(link, url):
+                    self.discover(link, url, depth + 1)
+
+    @staticmethod
+    def convert_to_soup(content, parser, encoding=None):
+        '''
+        Converts a response body to BeautifulSoup object using the selected
+        parser backend
+        '''
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(content, parser, from_encoding=encoding)
+        return soup
+
+    def discover(self, link, url=None, depth=0, priority=0.5, lastmod=None):
+        #resolve against the page the link was found on, so the same page
+        #reached through different spellings is only queued once
+        link = self.canonicalize(link, url)
+
+        #if format is in the exclusion list, do nothing
+        filename, file_extension = os.path.splitext(urlparse(link).path)
+        if file_extension in self.filter_formats:
+            self.metrics.count('skipped_formats')
+            return
+
+        score = 0
+        if self.prioritize:
+            score = self.score(depth, priority, lastmod)
+
+        #the frontier skips links that were already discovered or processed
+        if not self.frontier.add(link, score, depth):
+            self.metrics.count('already_seen')
+
+    def score(self, depth, priority=0.5, lastmod=None):
+        '''
+        Returns the crawl priority of a URL, higher goes first: its sitemap
+        priority, plus up to 0.5 for a recent lastmod (fading over about a
+        month), minus 0.1 per link hop from the seed or sitemap
+        '''
+        score = priority - 0.1 * depth
+        if lastmod is not None:
+            age = (datetime.date.today() - lastmod).days
+            score += 0.5 * math.exp(-(age if age > 0 else 0) / 30.0)
+        return score
+
+    def seed_sitemaps(self):
+        '''
+        Queues the URLs from the site's sitemaps, the ones robots.txt lists
+        or /sitemap.xml
+        '''
+        sitemaps = self.robots.get(self.url).site_maps() or [self.base_url + '/sitemap.xml']
+        reader = SitemapReader(self.sessions)
+
+        count = 0
+        for sitemap in sitemaps:
+            for loc, lastmod, priority in reader.urls(sitemap):
+                if self.is_valid_link(loc, self.url):
+                    self.discover(loc, self.url, depth=0, priority=priority, lastmod=lastmod)
+                    count += 1
+        print('Found %d URLs in sitemaps' %count)
+
+    def canonicalize(self, link, url=None):
+        '''
+        Returns the absolute form of link used for the seen check:
+        resolved against url (or the base url), fragment stripped, scheme and
+        host lowercased, default port and empty path normalized
+        '''
+        link = urljoin(url or self.base_url, link)
+        link = urldefrag(link)[0]
+        parsed = urlparse(link)
+
+        scheme = parsed.scheme.lower()
+        netloc = parsed.netloc.lower()
+        if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+            netloc = netloc.rsplit(':', 1)[0]
+
+        return urlunparse((scheme, netloc, parsed.path or '/', parsed.params, parsed.query, ''))
+
+    def is_valid_link(self, link, url):
+        '''
+        Returns True if link is valid, False otherwise
+        Valid links are synatically valid internal links which are
+        http or https
+        relative, absolute or hash links
+        '''
+
+        parent_url = urlparse(url)
+        parsed_link = urlparse(link)
+        is_valid = True
+
+        #only allow http or https schemes
+        if parsed_link.scheme != '':
+            if parsed_link.scheme != 'http' and parsed_link.scheme != 'https':
+                is_valid = False
+
+        #is link internal?
+        if self._normalize_url(parsed_link.netloc) != self._normalize_url(parent_url.netloc):
+            #not a relative link
+            if parsed_link.netloc != '':
+                is_valid = False
+
+        #is link a hash link?
+        if parsed_link.netloc == '' and parsed_link.path == '' and parsed_link.fragment == '':
+            is_valid = False
+
+        return is_valid
+
+    @staticmethod
+    def _normalize_url(url):
+        #normalize domains to test for www vs non-www
+        #remove www. and return result
+
+        url = re.sub('www.', '', url)
+
+        return url
+
+    def is_relative(self, url):
+        '''
+        Returns True or False depending on whether the url is relative
+        '''
+        url = urlparse(url)
+        return url.scheme == '' and url.netloc == ''
+
+
+    def _normalize_relative_links(self, url):
+        '''
+        Joins relative links with the base url
+        '''
+        if self.is_relative(url):
+            url = urljoin(self.base_url, url)
+        return url
+
+
+class HashRing(object):
+    '''
+    Consistent hash ring mapping hosts to shards. Each shard owns replicas
+    points on the ring, so adding or removing a shard only moves the hosts
+    that land next to its points
+    '''
+
+    def __init__(self, shards, replicas=100):
+        self.points = []
+        self.owners = []
+        for point, shard in sorted((self._hash('%s-%d' %(shard, replica)), shard)
+                                   for shard in range(shards) for replica in range(replicas)):
+            self.points.append(point)
+            self.owners.append(shard)
+
+    def shard(self, host):
+        '''
+        Returns the shard that owns host
+        '''
+        index = bisect.bisect(self.points, self._hash(host.lower())) % len(self.points)
+        return self.owners[index]
+
+    def _hash(self, key):
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def crawl_shard(hosts, max, sites=4, directory=None, timeout=(5, 30), options=None):
+    '''
+    Crawls every host of one shard, up to sites hosts at a time, and returns
+    {host: pages crawled}. hosts maps a host to its seed URLs. Runs in a
+    worker process of MultiSiteCrawler
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+
+    options = options or {}
+    if directory is not None:
+        os.chdir(directory)
+
+    def crawl_host(seeds):
+        workers = options.get('workers', 1)
+        #the other seeds of the host share the crawl and its output file
+        crawler = Crawler(seeds[0], max, sessions=SessionPool(workers, timeout), seeds=seeds[1:], **options)
+        try:
+            return crawler.run()
+        except Exception as e:
+            print('Crawl of %s failed: %s' %(seeds[0], e))
+            return 0
+        finally:
+            crawler.sessions.close()
+
+    #every host belongs to one crawler here, so its politeness delay holds
+    with ThreadPoolExecutor(max_workers=sites) as executor:
+        counts = executor.map(crawl_host, hosts.values())
+        return dict(zip(hosts, counts))
+
+class MultiSiteCrawler(object):
+    '''
+    Crawls many sites at once. Hosts are sharded across worker processes by
+    consistent hashing, so a host is only ever crawled by one process and
+    one Crawler, keeping its politeness delay. Output lands in the usual
+    per-host files (host.txt) in directory
+
+    MultiSiteCrawler(['http://a.example/', 'http://b.example/'], 10, processes=4).run()
+    '''
+
+    def __init__(self, seeds, max, processes=None, sites=4, directory=None, timeout=(5, 30), **options):
+        self.max = max
+        self.processes = processes or os.cpu_count() or 1
+        self.sites = sites
+        self.directory = directory
+        self.timeout = timeout
+        self.options = options
+        self.ring = HashRing(self.processes)
+
+        #group seeds by host, keeping their order. www.host and host are one
+        #site to is_valid_link, so they share a crawler and never run apart
+        self.hosts = {}
+        for seed in seeds:
+            host = Crawler._normalize_url(urlparse(seed).netloc.lower())
+            self.hosts.setdefault(host, []).append(seed)
+
+    def shards(self):
+        '''
+        Returns one {host: seeds} dict per shard that has any hosts
+        '''
+        shards = [{} for i in range(self.processes)]
+        for host, seeds in self.hosts.items():
+            shards[self.ring.shard(host)][host] = seeds
+        return [shard for shard in shards if shard]
+
+    def run(self):
+        '''
+        Crawls every site and returns {host: pages crawled}
+        '''
+        from concurrent.futures import ProcessPoolExecutor
+
+        shards = self.shards()
+        print('crawling %d sites in %d shards' %(len(self.hosts), len(shards)))
+        if not shards:
+            return {}
+
+        counts = {}
+        with ProcessPoolExecutor(len(shards)) as executor:
+            futures = [executor.submit(crawl_shard, shard, self.max, self.sites, self.directory,
+                                       self.timeout, self.options)
+                       for shard in shards]
+            for future in futures:
+                counts.update(future.result())
+
+        print('Total pages crawled: %d from %d sites' %(sum(counts.values()), len(counts)))
+        return counts
+
+def read_seeds(path):
+    '''
+    Returns the seed URLs in a file, one per line, skipping blank lines and
+    # comments
+    '''
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Crawls a site and saves a text representation of its pages')
+    parser.add_argument('url', nargs='?', help='seed URL to start crawling from')
+    parser.add_argument('--seeds', help='file of seed URLs, one per line, to crawl many sites at once')
+    parser.add_argument('--processes', type=int,
+                        help='with --seeds, processes to shard the sites across (default one per core)')
+    parser.add_argument('--sites', type=int, default=4,
+                        help='with --seeds, sites each process crawls at the same time (default 4)')
+    parser.add_argument('--max', type=int, default=10, help='max pages to crawl (default 10)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='concurrent fetch workers, 1 crawls one page at a time (default 1)')
+    parser.add_argument('--delay', type=float, default=1,
+                        help='seconds between requests to a host unless robots.txt sets a delay (default 1)')
+    parser.add_argument('--parser', default='html.parser', choices=['html.parser', 'lxml', 'stream'],
+                        help='html parser backend, lxml needs lxml installed (default html.parser)')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='parser processes, 0 parses on the fetch threads')
+    parser.add_argument('--output', default='text', choices=['text', 'jsonl'], help='output format (default text)')
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], help='compress output, zstd needs zstandard')
+    parser.add_argument('--shard-size', type=int, help='roll over to a new output file after this many bytes')
+    parser.add_argument('--max-body', type=int, default=10 * 1024 * 1024,
+                        help='abandon pages bigger than this many bytes, 0 for no limit (default 10 MB)')
+    parser.add_argument('--connect-timeout', type=float, default=5, help='seconds to wait for a connection')
+    parser.add_argument('--read-timeout', type=float, default=30, help='seconds to wait for a response')
+    parser.add_argument('--bloom-capacity', type=int,
+                        help='keep the seen-set in a Bloom filter sized for this many URLs')
+    parser.add_argument('--state', help='sqlite file remembering pages between crawls for incremental recrawls')
+    parser.add_argument('--checkpoint', help='directory to checkpoint the crawl to')
+    parser.add_argument('--resume', action='store_true', help='continue from the last checkpoint')
+    parser.add_argument('--dedupe', action='store_true', help='skip exact and near-duplicate pages')
+    parser.add_argument('--prioritize', action='store_true',
+                        help='crawl by priority (depth, sitemap priority and lastmod) instead of FIFO')
+    parser.add_argument('--sitemaps', action='store_true',
+                        help='seed the crawl from the sitemaps in robots.txt or /sitemap.xml, implies --prioritize')
+    parser.add_argument('--stats-interval', type=float, default=10, help='seconds between stats lines (default 10)')
+    parser.add_argument('--metrics-json', help='file to dump crawl metrics to as JSON at exit')
+    parser.add_argument('--prometheus', help='file to keep crawl metrics in, in Prometheus text format')
+    args = parser.parse_args(argv)
+
+    if (args.url is None) == (args.seeds is None):
+        parser.error('give either a url or --seeds')
+    if args.resume and not args.checkpoint:
+        parser.error('--resume needs --checkpoint')
+    if args.seeds and (args.state or args.checkpoint or args.metrics_json or args.prometheus):
+        parser.error('--state, --checkpoint, --metrics-json and --prometheus only work with a single url')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.seeds:
+        crawler = MultiSiteCrawler(read_seeds(args.seeds), args.max, args.processes, args.sites,
+                                   timeout=(args.connect_timeout, args.read_timeout), workers=args.workers,
+                                   delay=args.delay, bloom_capacity=args.bloom_capacity, parser=args.parser,
+                                   output=args.output, compression=args.compression,
+                                   shard_size=args.shard_size, parse_workers=args.parse_workers,
+                                   dedupe=args.dedupe, stats_interval=args.stats_interval,
+                                   prioritize=args.prioritize, sitemaps=args.sitemaps, max_body=args.max_body)
+        crawler.run()
+        return
+
+    crawler = Crawler(args.url, args.max, args.workers, delay=args.delay,
+                      bloom_capacity=args.bloom_capacity, parser=args.parser,
+                      output=args.output, compression=args.compression, shard_size=args.shard_size,
+                      sessions=SessionPool(args.workers, (args.connect_timeout, args.read_timeout)),
+                      state=args.state, checkpoint=args.checkpoint, resume=args.resume,
+                      parse_workers=args.parse_workers, dedupe=args.dedupe,
+                      stats_interval=args.stats_interval, metrics_file=args.metrics_json,
+                      prometheus_file=args.prometheus, prioritize=args.prioritize,
+                      sitemaps=args.sitemaps, max_body=args.max_body)
+    crawler.run()
+
+#guarded so importing this file (and parser processes) does not crawl
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+'''
+Benchmarks text_scraper's Crawler end to end against a generated site served
+from a local HTTP server, so crawler changes can be measured without
+touching real sites
+
+Usage:
+python text_scraper_bench.py --pages 2000 --fanout 10 --workers 8
+
+The site has --pages pages, each linking to --fanout random others, with
+about --page-size bytes of text and --latency seconds of server delay per
+request. --disallow puts that fraction of pages under a path robots.txt
+disallows, --duplicates serves that fraction of pages with the body of
+another page, and --etag answers If-None-Match with 304s (use --recrawl to
+crawl twice against the same state file).
+
+Reports pages/sec, bytes/sec, CPU time (including parser processes) and
+peak RSS for every crawl. The server runs in its own process so its work
+is not counted against the crawler
+'''
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from text_scraper import Crawler
+from text_scraper import SessionPool
+
+class SyntheticSite(object):
+    '''
+    Deterministic generated site, every page is built from the seed
+    '''
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit',
+             'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore',
+             'magna', 'aliqua', 'enim', 'minim', 'veniam', 'quis', 'nostrud', 'exercitation']
+
+    def __init__(self, pages, fanout, page_size, disallow=0.0, duplicates=0.0, seed=0):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_size = page_size
+        self.disallow = disallow
+        self.duplicates = duplicates
+        self.seed = seed
+
+    def path(self, number):
+        if number and self._chance(number, 'disallow') < self.disallow:
+            return '/private/%d.html' %number
+        return '/%d.html' %number if number else '/'
+
+    def number(self, path):
+        '''
+        Returns the page number for path, or None if there is no such page
+        '''
+        name = path.rsplit('/', 1)[-1]
+        if path == '/':
+            return 0
+        if not name.endswith('.html') or not name[:-5].isdigit():
+            return None
+        number = int(name[:-5])
+        if number >= self.pages or self.path(number) != path:
+            return None
+        return number
+
+    def body(self, number):
+        #duplicate pages serve another page's body word for word
+        if number and self._chance(number, 'duplicate') < self.duplicates:
+            number = random.Random('%s-%d-original' %(self.seed, number)).randrange(number)
+
+        rng = random.Random('%s-%d' %(self.seed, number))
+        links = ''.join('<li><a href="%s">page %d</a></li>' %(self.path(target), target)
+                        for target in [rng.randrange(self.pages) for i in range(self.fanout)])
+
+        paragraphs = []
+        size = 0
+        while size < self.page_size:
+            paragraph = ' '.join(rng.choice(self.words) for i in range(60))
+            paragraphs.append('<p>%s</p>' %paragraph)
+            size += len(paragraph) + 7
+
+        return ('<html><head><title>Page %d</title></head><body>'
+                '<nav><ul>%s</ul></nav><h1>Page %d</h1>%s</body></html>'
+                %(number, links, number, ''.join(paragraphs))).encode('utf-8')
+
+    def robots(self, crawl_delay=None):
+        lines = ['User-agent: *', 'Disallow: /private/']
+        if crawl_delay:
+            lines.append('Crawl-delay: %d' %crawl_delay)
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _chance(self, number, kind):
+        return random.Random('%s-%d-%s' %(self.seed, number, kind)).random()
+
+def serve(site, latency, etag, crawl_delay, ready):
+    '''
+    Serves site until the process is terminated, sends the port to ready
+    '''
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+
+            if self.path == '/robots.txt':
+                return self.respond(200, site.robots(crawl_delay), 'text/plain')
+
+            number = site.number(self.path.split('?', 1)[0])
+            if number is None:
+                return self.respond(404, b'not found', 'text/plain')
+
+            tag = '"page-%d"' %number
+            if etag and self.headers.get('If-None-Match') == tag:
+                return self.respond(304, b'', None, tag)
+            self.respond(200, site.body(number), 'text/html; charset=utf-8', tag if etag else None)
+
+        def respond(self, status, body, content_type, tag=None):
+            self.send_response(status)
+            if content_type:
+                self.send_header('Content-Type', content_type)
+            if tag:
+                self.send_header('ETag', tag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    ready.send(server.server_address[1])
+    server.serve_forever()
+
+def usage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    #ru_maxrss is in kilobytes on Linux
+    return cpu, max(own.ru_maxrss, children.ru_maxrss) / 1024.0
+
+def run_crawl(args, port, directory, label):
+    crawler = Crawler('http://127.0.0.1:%d/' %port, args.pages, args.workers, delay=args.delay,
+                      parser=args.parser, output=args.output, compression=args.compression,
+                      sessions=SessionPool(args.workers), parse_workers=args.parse_workers,
+                      dedupe=args.dedupe, stats_interval=float('inf'),
+                      state=os.path.join(directory, 'state.db') if args.recrawl else None)
+
+    cpu_before = usage()[0]
+    start = time.perf_counter()
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            pages = crawler.run()
+    finally:
+        os.chdir(previous)
+    wall = time.perf_counter() - start
+    cpu, rss = usage()
+
+    summary = crawler.metrics.summary()
+    print('%-8s %6d pages in %6.2fs  %8.1f pages/s  %8.2f MB/s  cpu %6.2fs  peak rss %6.1f MB  '
+          'statuses %s  duplicates %d' %(
+              label, pages, wall, pages / wall, summary['counters'].get('bytes', 0) / wall / 1e6,
+              cpu - cpu_before, rss, summary['statuses'], summary['counters'].get('duplicates', 0)))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the crawler against a local synthetic site')
+    parser.add_argument('--pages', type=int, default=500, help='pages on the site, also the crawl limit')
+    parser.add_argument('--fanout', type=int, default=10, help='links per page')
+    parser.add_argument('--page-size', type=int, default=5000, help='approximate bytes of text per page')
+    parser.add_argument('--latency', type=float, default=0.0, help='server delay per request in seconds')
+    parser.add_argument('--disallow', type=float, default=0.0, help='fraction of pages disallowed by robots.txt')
+    parser.add_argument('--crawl-delay', type=int, help='Crawl-delay for robots.txt')
+    parser.add_argument('--duplicates', type=float, default=0.0, help='fraction of pages duplicating another')
+    parser.add_argument('--etag', action='store_true', help='send ETags and answer If-None-Match with 304')
+    parser.add_argument('--recrawl', action='store_true', help='crawl twice with a page-state file')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the generated site')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--delay', type=float, default=0, help='crawler politeness delay (default 0)')
+    parser.add_argument('--parser', default='html.parser', choices=['html.parser', 'lxml', 'stream'])
+    parser.add_argument('--parse-workers', type=int, default=0)
+    parser.add_argument('--output', default='text', choices=['text', 'jsonl'])
+    parser.add_argument('--compression', choices=['gzip', 'zstd'])
+    parser.add_argument('--dedupe', action='store_true')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    site = SyntheticSite(args.pages, args.fanout, args.page_size, args.disallow, args.duplicates, args.seed)
+
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    server = multiprocessing.Process(target=serve, args=(site, args.latency, args.etag, args.crawl_delay, sender),
+                                     daemon=True)
+    server.start()
+    port = receiver.recv()
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            run_crawl(args, port, directory, 'crawl')
+            if args.recrawl:
+                run_crawl(args, port, directory, 'recrawl')
+    finally:
+        server.terminate()
+        server.join()
+
+if __name__ == '__main__':
+    main()